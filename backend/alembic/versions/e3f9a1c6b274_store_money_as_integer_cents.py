@@ -0,0 +1,43 @@
+"""Store money as integer cents
+
+Revision ID: e3f9a1c6b274
+Revises: c47a2e9b5f18
+Create Date: 2026-10-18 15:12:03.291846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3f9a1c6b274'
+down_revision: Union[str, None] = 'c47a2e9b5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, old column, new column, old type) for every money column
+MONEY_COLUMNS = [
+    ('pizzas', 'price', 'price_cents', sa.Numeric(10, 2)),
+    ('toppings', 'price', 'price_cents', sa.Numeric(10, 2)),
+    ('carts', 'total_price', 'total_price_cents', sa.Float()),
+    ('carts', 'discounted_price', 'discounted_price_cents', sa.Float()),
+    ('orders', 'total_price', 'total_price_cents', sa.Numeric(10, 2)),
+    ('coupons', 'discount', 'discount_cents', sa.Numeric(5, 2)),
+]
+
+
+def upgrade() -> None:
+    for table, old_column, new_column, _ in MONEY_COLUMNS:
+        op.add_column(table, sa.Column(new_column, sa.Integer(), nullable=True))
+        # Round to the nearest cent, float cart totals may carry representation error
+        op.execute(f'UPDATE {table} SET {new_column} = CAST(ROUND({old_column} * 100) AS INTEGER)')
+        op.drop_column(table, old_column)
+
+
+def downgrade() -> None:
+    for table, old_column, new_column, old_type in reversed(MONEY_COLUMNS):
+        op.add_column(table, sa.Column(old_column, old_type, nullable=True))
+        op.execute(f'UPDATE {table} SET {old_column} = {new_column} / 100.0')
+        op.drop_column(table, new_column)
@@ -0,0 +1,68 @@
+"""Round trips and commits per checkout as a function of cart size (services/cart.checkout_cart)."""
+import asyncio
+
+from benchmarks.common import StatementCounter, use_scratch_database
+
+use_scratch_database("checkout")
+
+from db.config import AsyncSessionLocal, SessionLocal, async_engine  # noqa: E402
+from models.models import Cart, CartItem, CartTopping, OrderItem, OrderTopping, Pizza, Topping, User  # noqa: E402
+from services.cart import checkout_cart  # noqa: E402
+
+CART_SIZES = [1, 5, 10, 25, 50]
+TOPPINGS_PER_ITEM = 2
+RUNS = 5
+
+
+def fill_cart(user_id: int, size: int) -> int:
+    db = SessionLocal()
+    cart = Cart(user_id=user_id, total_price_cents=0, discounted_price_cents=0)
+    for index in range(size):
+        item = CartItem(pizza_id=index % 5 + 1, quantity=index % 3 + 1)
+        item.cart_toppings = [
+            CartTopping(topping_id=(index + offset) % 5 + 1, quantity=1) for offset in range(TOPPINGS_PER_ITEM)
+        ]
+        cart.cart_items.append(item)
+    db.add(cart)
+    db.commit()
+    cart_id = cart.id
+    db.close()
+    return cart_id
+
+
+async def main():
+    db = SessionLocal()
+    db.add_all([Pizza(name=f"Pizza {i}", price_cents=900 + i) for i in range(5)])
+    db.add_all([Topping(name=f"Topping {i}", price_cents=50 + i) for i in range(5)])
+    user = User(name="bench", email="bench@example.com", password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    counter = StatementCounter(async_engine.sync_engine)
+    print(f"{async_engine.dialect.name}, {TOPPINGS_PER_ITEM} toppings per item, median of {RUNS} checkouts")
+    print(f"{'items':>6} {'statements':>11} {'commits':>8} {'ms':>8}")
+    for size in CART_SIZES:
+        runs = []
+        for _ in range(RUNS):
+            cart_id = fill_cart(user_id, size)
+            async with AsyncSessionLocal() as session:
+                with counter.measure() as stats:
+                    order = await checkout_cart(cart_id, session)
+            runs.append(stats)
+
+            check = SessionLocal()
+            items = check.query(OrderItem).filter(OrderItem.order_id == order.id).count()
+            toppings = check.query(OrderTopping).join(OrderItem).filter(OrderItem.order_id == order.id).count()
+            check.close()
+            assert (items, toppings) == (size, size * TOPPINGS_PER_ITEM), (items, toppings)
+
+        runs.sort(key=lambda stats: stats["seconds"])
+        median = runs[len(runs) // 2]
+        print(f"{size:>6} {median['statements']:>11} {median['commits']:>8} {median['seconds'] * 1000:>8.2f}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
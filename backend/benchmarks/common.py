@@ -0,0 +1,57 @@
+"""
+Shared setup for the benchmark scripts.
+
+Run them from the backend directory, e.g. `python -m benchmarks.checkout_round_trips`.
+Without DATABASE_URL a throwaway SQLite file is used; to measure PostgreSQL,
+point DATABASE_URL at a scratch database, the scripts create and fill tables.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def use_scratch_database(name: str):
+    # Must run before anything imports db.config
+    if "DATABASE_URL" not in os.environ:
+        path = os.path.join(tempfile.gettempdir(), f"pizza-benchmark-{name}.db")
+        if os.path.exists(path):
+            os.remove(path)
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+
+    from db.config import Base, engine
+    import models.models  # noqa: F401  (registers the tables)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+class StatementCounter:
+    """Counts statements sent to the database (round trips) and commits on an engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_statement(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    @contextmanager
+    def measure(self):
+        """Yield a dict that holds statements, commits and seconds for the block once it exits."""
+        stats = {}
+        statements, commits = self.statements, self.commits
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats["seconds"] = time.perf_counter() - started
+            stats["statements"] = self.statements - statements
+            stats["commits"] = self.commits - commits
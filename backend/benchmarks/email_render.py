@@ -0,0 +1,144 @@
+"""
+Order confirmation rendering: the precompiled Jinja template against the
+string building it replaced (services/email).
+
+The old path loaded each order with three queries and built the HTML with
+f-string concatenation, scanning every topping of the order for every item.
+The current path loads a batch of orders in one joined query and renders the
+template compiled at import. Both are timed end to end (load and render) and
+for rendering alone, and their output is compared with whitespace ignored.
+"""
+import asyncio
+import time
+
+from benchmarks.common import StatementCounter, use_scratch_database
+
+use_scratch_database("email")
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from db.config import AsyncSessionLocal, SessionLocal, async_engine  # noqa: E402
+from models.models import Order, OrderItem, OrderTopping, Pizza, Topping, User  # noqa: E402
+from services.email import load_orders_for_email, render_order_email  # noqa: E402
+from services.pricing import format_cents  # noqa: E402
+
+ORDERS = 300
+ITEMS = 10
+TOPPINGS_PER_ITEM = 3
+RENDER_RUNS = 5
+
+
+# The renderer before the template, kept verbatim apart from being synchronous
+def generate_order_email(order_data: dict):
+    order = order_data['order']
+    items = order_data['order_items']
+    toppings = order_data['order_toppings']
+
+    email_body = f"""
+    <h1>Order Confirmation</h1>
+    <p>Thank you for your order!</p>
+    <p><strong>Order ID:</strong> {order.id}</p>
+    <p><strong>Order Date:</strong> {order.created_at}</p>
+    <p><strong>Total Price:</strong> ₹{format_cents(order.total_price_cents)}</p>
+    <p><strong>Status:</strong> {order.status}</p>
+
+    <h2>Order Items:</h2>
+    <ul>
+    """
+    for item in items:
+        pizza_name = item.pizza.name
+        item_price_cents = item.pizza.price_cents
+        quantity = item.quantity
+
+        email_body += f"""
+        <li>
+            <strong>{pizza_name}</strong> x {quantity} - ₹{format_cents(item_price_cents * quantity)}
+            <ul>
+        """
+
+        for topping in toppings:
+            if topping.order_item_id == item.id:
+                topping_name = topping.topping.name
+                topping_price = format_cents(topping.topping.price_cents)
+                email_body += f"""
+                    <li>{topping_name} - ₹{topping_price}</li>
+                """
+
+        email_body += "</ul></li>"
+
+    email_body += "</ul>"
+
+    return email_body
+
+
+async def load_order_data(order_id: int, db):
+    # The old per-order loading: order, items with pizzas, toppings with their topping
+    result = await db.execute(select(Order).options(selectinload(Order.user)).filter(Order.id == order_id))
+    order = result.scalars().first()
+    result = await db.execute(
+        select(OrderItem).options(selectinload(OrderItem.pizza)).filter(OrderItem.order_id == order.id)
+    )
+    items = result.scalars().all()
+    result = await db.execute(
+        select(OrderTopping)
+        .options(selectinload(OrderTopping.topping))
+        .filter(OrderTopping.order_item_id.in_([item.id for item in items]))
+    )
+    return {"order": order, "order_items": items, "order_toppings": result.scalars().all()}
+
+
+def fill_orders():
+    db = SessionLocal()
+    db.add(User(name="bench", email="bench@example.com", password="x"))
+    db.add_all([Pizza(name=f"Pizza {i}", price_cents=500 + i) for i in range(ITEMS)])
+    db.add_all([Topping(name=f"Topping {i}", price_cents=50 + i) for i in range(TOPPINGS_PER_ITEM)])
+    for _ in range(ORDERS):
+        order = Order(user_id=1, status="Received", total_price_cents=12345)
+        for index in range(ITEMS):
+            item = OrderItem(pizza_id=index + 1, quantity=2)
+            item.order_toppings = [OrderTopping(topping_id=t + 1, quantity=1) for t in range(TOPPINGS_PER_ITEM)]
+            order.order_items.append(item)
+        db.add(order)
+    db.commit()
+    db.close()
+
+
+def per_order_us(render, inputs):
+    started = time.perf_counter()
+    for _ in range(RENDER_RUNS):
+        for value in inputs:
+            render(value)
+    return (time.perf_counter() - started) / RENDER_RUNS / len(inputs) * 1e6
+
+
+async def main():
+    fill_orders()
+    order_ids = list(range(1, ORDERS + 1))
+    counter = StatementCounter(async_engine.sync_engine)
+
+    async with AsyncSessionLocal() as db:
+        with counter.measure() as old:
+            order_data = [await load_order_data(order_id, db) for order_id in order_ids]
+            old_bodies = [generate_order_email(data) for data in order_data]
+    async with AsyncSessionLocal() as db:
+        with counter.measure() as new:
+            orders = await load_orders_for_email(order_ids, db)
+            new_bodies = [render_order_email(order) for order in orders]
+
+    normalize = lambda body: "".join(body.split())  # noqa: E731
+    same = all(normalize(a) == normalize(b) for a, b in zip(old_bodies, new_bodies))
+    old["render_us"] = per_order_us(generate_order_email, order_data)
+    new["render_us"] = per_order_us(render_order_email, orders)
+
+    print(f"{async_engine.dialect.name}, {ORDERS} orders x {ITEMS} items x {TOPPINGS_PER_ITEM} toppings")
+    print(f"{'':<16} {'load+render ms':>15} {'statements':>11} {'render us/order':>16}")
+    for label, stats in (("string building", old), ("template", new)):
+        print(f"{label:<16} {stats['seconds'] * 1000:>15.0f} {stats['statements']:>11} {stats['render_us']:>16.0f}")
+    print(f"same output (whitespace ignored): {same}")
+    assert same
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
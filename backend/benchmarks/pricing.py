@@ -0,0 +1,109 @@
+"""
+Per-cart pricing cost and cart repricing throughput (services/pricing).
+
+Part one prices a 5-line cart with 3 toppings per line and applies a coupon,
+once the way the cart code did before money moved to integer cents (Numeric
+prices summed as Decimal, a Float total, Decimal(str(...)) round trips for the
+coupon) and once with the cents helpers. Part two fills CARTS carts, changes
+menu prices and times reprice_carts, then checks the result with
+reconcile_cart_totals. Pass a cart count to override CARTS.
+"""
+import asyncio
+import sys
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks.common import StatementCounter, use_scratch_database
+
+use_scratch_database("pricing")
+
+from db.config import AsyncSessionLocal, async_engine, engine  # noqa: E402
+from models.models import Cart, CartItem, CartTopping, Coupon, Pizza, Topping, User  # noqa: E402
+from services.pricing import apply_discount, line_cents, reconcile_cart_totals, reprice_carts  # noqa: E402
+
+CARTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+PRICING_RUNS = 200000
+
+LINES_CENTS = [(1050, 2, [(125, 1), (200, 2), (75, 1)])] * 5
+LINES_NUMERIC = [(Decimal("10.50"), 2, [(Decimal("1.25"), 1), (Decimal("2.00"), 2), (Decimal("0.75"), 1)])] * 5
+
+
+def price_cart_numeric():
+    total = 0
+    for price, quantity, toppings in LINES_NUMERIC:
+        total += price * quantity + sum(topping_price * topping_quantity for topping_price, topping_quantity in toppings)
+    total = float(total)
+    return max(0.0, float(Decimal(str(total)) - Decimal(str(5.0))))
+
+
+def price_cart_cents():
+    total = sum(line_cents(price, quantity, toppings) for price, quantity, toppings in LINES_CENTS)
+    return apply_discount(total, 500)
+
+
+def bench_per_cart_pricing():
+    assert price_cart_numeric() * 100 == price_cart_cents()
+    print(f"per-cart pricing, 5 lines x 3 toppings plus a coupon, {PRICING_RUNS} runs")
+    for function in (price_cart_numeric, price_cart_cents):
+        seconds = timeit.timeit(function, number=PRICING_RUNS)
+        print(f"  {function.__name__:<20} {seconds / PRICING_RUNS * 1e6:.2f} us/cart")
+
+
+def fill_carts():
+    # Two lines per cart with one topping each, every tenth cart holds a coupon
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [{"id": 1, "name": "bench", "email": "bench@example.com"}])
+        connection.execute(Pizza.__table__.insert(), [
+            {"id": i, "name": f"Pizza {i}", "price_cents": 1000 + i} for i in range(1, 11)
+        ])
+        connection.execute(Topping.__table__.insert(), [
+            {"id": i, "name": f"Topping {i}", "price_cents": 100 + i} for i in range(1, 6)
+        ])
+        connection.execute(Coupon.__table__.insert(), [
+            {"id": 1, "code": "BENCH", "discount_cents": 500, "expiration_date": date.today() + timedelta(days=1)}
+        ])
+        connection.execute(Cart.__table__.insert(), [
+            {"id": i, "user_id": 1, "total_price_cents": 0, "discounted_price_cents": 0,
+             "coupon_id": 1 if i % 10 == 0 else None}
+            for i in range(1, CARTS + 1)
+        ])
+        items = [
+            {"id": i * 2 + k, "cart_id": i, "pizza_id": (i + k) % 10 + 1, "quantity": k + 1}
+            for i in range(1, CARTS + 1) for k in range(2)
+        ]
+        connection.execute(CartItem.__table__.insert(), items)
+        connection.execute(CartTopping.__table__.insert(), [
+            {"cart_item_id": item["id"], "topping_id": item["id"] % 5 + 1, "quantity": 1} for item in items
+        ])
+
+
+async def bench_repricing():
+    fill_carts()
+    counter = StatementCounter(async_engine.sync_engine)
+    print(f"reprice_carts, {async_engine.dialect.name}, {CARTS} carts of 2 lines")
+    runs = [
+        ("all pizzas", None, {"pizza_ids": range(1, 11)}),
+        ("pizza 3", Pizza.__table__.update().where(Pizza.id == 3).values(price_cents=2500), {"pizza_ids": [3]}),
+        ("topping 2", Topping.__table__.update().where(Topping.id == 2).values(price_cents=175), {"topping_ids": [2]}),
+    ]
+    async with AsyncSessionLocal() as db:
+        for label, price_change, changes in runs:
+            if price_change is not None:
+                await db.execute(price_change)
+                await db.commit()
+            with counter.measure() as stats:
+                result = await reprice_carts(db, **changes)
+            print(
+                f"  {label:<11} {result['carts']:>7} carts {result['carts_per_second']:>8} carts/s"
+                f" {stats['statements']:>5} statements"
+            )
+        drift = await reconcile_cart_totals(db)
+    print(f"  reconcile afterwards: {drift['checked']} checked, {drift['repaired']} repaired")
+    assert drift["repaired"] == 0
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    bench_per_cart_pricing()
+    asyncio.run(bench_repricing())
@@ -1,5 +1,6 @@
 from pydantic import BaseSettings
 import os
+from typing import Optional
 
 class Settings(BaseSettings):
     # JWT Configuration
@@ -12,6 +13,74 @@ class Settings(BaseSettings):
 
     # Database Configuration (Add if necessary)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./test.db")  # Example for DB URL
+
+    # Principal cache for authenticated requests
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60  # How long a resolved user stays cached
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000  # Maximum number of cached users (LRU eviction)
+
+    # Stateless auth: build the user from token claims (id, role) without a database lookup
+    STATELESS_AUTH: bool = False
+    TOKEN_DENYLIST_REFRESH_SECONDS: int = 30  # How often the revoked token filter is rebuilt and expired rows purged
+    TOKEN_DENYLIST_BLOOM_BITS: int = 1 << 20  # Bloom filter size (128 KB)
+    TOKEN_DENYLIST_HASH_COUNT: int = 5
+
+    # Password hashing pool (bcrypt runs off the event loop)
+    PASSWORD_HASH_WORKERS: int = 4  # Concurrent bcrypt operations
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # Waiting operations before requests are rejected with 503
+
+    # Admin order listing (keyset pagination)
+    ORDERS_PAGE_SIZE: int = 50
+    ORDERS_MAX_PAGE_SIZE: int = 200
+    ORDER_EXPORT_BATCH_SIZE: int = 1000  # Rows fetched per round trip when streaming the export
+
+    # Coupon code lookup cache
+    COUPON_CACHE_TTL_SECONDS: int = 300  # Upper bound, entries also expire with the coupon
+    COUPON_NEGATIVE_CACHE_TTL_SECONDS: int = 30  # How long unknown or expired codes are remembered
+    COUPON_CACHE_MAX_SIZE: int = 10000
+
+    # Cart totals are maintained incrementally, reconciliation repairs any drift
+    CART_RECONCILE_INTERVAL_SECONDS: int = 0  # 0 disables the background reconciliation loop
+    CART_RECONCILE_BATCH_SIZE: int = 500  # Carts checked per transaction
+    CART_REPRICE_BATCH_SIZE: int = 1000  # Carts repriced per UPDATE after a menu price change
+
+    # Automatic order status progression after checkout
+    ORDER_STATUS_STEP_SECONDS: int = 5  # Time spent in each status before moving to the next
+    ORDER_STATUS_TICK_SECONDS: float = 1.0  # Resolution of the scheduler
+    ORDER_STATUS_BATCH_SIZE: int = 1000  # Orders advanced per UPDATE
+    ORDER_EVENTS_QUEUE_SIZE: int = 16  # Pending status events per live subscriber before the oldest is dropped
+    ORDER_EVENTS_KEEPALIVE_SECONDS: int = 15  # Comment lines keeping idle event streams open through proxies
+    ORDER_EVENTS_RECHECK_SECONDS: int = 60  # Idle streams re-read their order this often, in case an event was missed
+
+    # Outgoing email, queued in the email_outbox table and sent by a background worker
+    SMTP_HOST: str = "smtp.gmail.com"
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: Optional[str] = None  # Set in the environment or .env; no login when unset
+    SMTP_PASSWORD: Optional[str] = None  # Use app-specific password if using Gmail
+    SMTP_STARTTLS: bool = True
+    SMTP_IDLE_SECONDS: int = 60  # Pooled connections idle longer than this are reconnected
+    EMAIL_SENDER: str = "travelcrafters10@gmail.com"
+    EMAIL_SENDER_NAME: str = "PIzza Par5adise"
+    EMAIL_WORKERS: int = 4  # Sender threads, each with its own pooled SMTP connection
+    EMAIL_OUTBOX_POLL_SECONDS: float = 2.0  # Fallback poll, checkouts in this process wake the worker directly
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50  # Messages claimed per round
+    EMAIL_CLAIM_SECONDS: int = 300  # Claimed messages are retried if no result is recorded in time
+    EMAIL_MAX_ATTEMPTS: int = 5
+    EMAIL_RETRY_BASE_SECONDS: int = 30  # Doubles after every failed attempt
+    EMAIL_RETRY_MAX_SECONDS: int = 3600
+
+    # Events shared between workers (cache invalidation, order status)
+    EVENT_BUS_BACKEND: str = "auto"  # "postgres" (LISTEN/NOTIFY), "memory" (single process) or "auto" from the database
+    EVENT_BUS_PING_SECONDS: int = 30  # Idle listener connections are checked this often
+    EVENT_BUS_RETRY_SECONDS: int = 5  # Delay before reconnecting a lost listener connection
+
+    # Menu catalog snapshot served from memory
+    MENU_CATALOG_MAX_AGE_SECONDS: int = 60  # Upper bound for picking up changes made through other workers
+
+    # Pizza image uploads
+    IMAGE_UPLOAD_MAX_BYTES: int = 5 * 1024 * 1024  # Larger uploads are rejected with 413
+    IMAGE_UPLOAD_CHUNK_BYTES: int = 64 * 1024  # Streamed to disk in chunks of this size
+    IMAGE_PROCESS_WORKERS: int = 2  # Processes generating thumbnails and WebP variants
+    IMAGE_VARIANT_QUALITY: int = 70
     
     # Add any other necessary configurations here
     
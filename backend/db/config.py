@@ -1,27 +1,70 @@
-
-
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Load database URL from environment variable or default to SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create SQLAlchemy engine
+# Async drivers used for each backend when ASYNC_DATABASE_URL is not set explicitly
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Translate a sync DATABASE_URL (psycopg2/pysqlite) into its async driver equivalent."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return str(url.set(drivername=ASYNC_DRIVERS[backend]))
+
+
+# Async URL can be overridden (e.g. to pick a different driver), otherwise derived from DATABASE_URL.
+# The request path is async only; what is configurable is the async driver, not sync vs async.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or get_async_database_url(DATABASE_URL)
+
+# Connection pool sizing for the async engine (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# Create SQLAlchemy engine (used by Alembic, scripts and background threads)
 engine = create_engine(DATABASE_URL)
 
+# Create async SQLAlchemy engine (used by the API request path)
+async_engine_options = {"pool_pre_ping": True}
+if make_url(ASYNC_DATABASE_URL).get_backend_name() != "sqlite":
+    async_engine_options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+
 # Session setup
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async session setup; objects stay usable after commit since lazy loads are not allowed
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 # Base class for models
 Base = declarative_base()
 
 # Dependency to get the database session
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Sync session for code running outside the event loop
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-
@@ -1,8 +1,18 @@
 from fastapi import FastAPI
-from routes import auth, pizza, toppings, coupons, cart, order,users,email
+from routes import auth, pizza, toppings, coupons, cart, order,users,email, menu
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
+from core.config import settings
+from services.pricing import run_cart_reconciler
+from services.cart import run_order_status_advancer
+from services.email import run_email_outbox_worker
+from utils.smtp import smtp_pool
+from utils.event_bus import event_bus
+from utils.images import shutdown_image_pool
+from utils.revocation import run_deny_list_refresher, token_deny_list
+from db.config import AsyncSessionLocal
 
 app = FastAPI()
 
@@ -22,6 +32,65 @@ if not os.path.exists(static_dir):
 
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
+# Cross-worker events: cache invalidation and live order status
+@app.on_event("startup")
+async def start_event_bus():
+    await event_bus.start()
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    await event_bus.stop()
+
+# Revoked token filter, rebuilt in the background instead of on the auth path
+@app.on_event("startup")
+async def start_deny_list_refresher():
+    try:
+        async with AsyncSessionLocal() as db:
+            await token_deny_list.refresh(db)
+    except Exception as e:
+        # Checks fall back to the table until the next refresh succeeds
+        print(f"Error refreshing token deny-list: {str(e)}")
+    app.state.deny_list_refresher = asyncio.create_task(run_deny_list_refresher(token_deny_list))
+
+@app.on_event("shutdown")
+async def stop_deny_list_refresher():
+    app.state.deny_list_refresher.cancel()
+
+# Periodically repair drift in incrementally maintained cart totals
+@app.on_event("startup")
+async def start_cart_reconciler():
+    if settings.CART_RECONCILE_INTERVAL_SECONDS > 0:
+        app.state.cart_reconciler = asyncio.create_task(run_cart_reconciler(settings.CART_RECONCILE_INTERVAL_SECONDS))
+
+@app.on_event("shutdown")
+async def stop_cart_reconciler():
+    task = getattr(app.state, "cart_reconciler", None)
+    if task:
+        task.cancel()
+
+@app.on_event("shutdown")
+async def stop_image_pool():
+    shutdown_image_pool()
+
+# Single task moving placed orders through their statuses
+@app.on_event("startup")
+async def start_order_status_advancer():
+    app.state.order_status_advancer = asyncio.create_task(run_order_status_advancer())
+
+@app.on_event("shutdown")
+async def stop_order_status_advancer():
+    app.state.order_status_advancer.cancel()
+
+# Sends the email queued in the outbox table
+@app.on_event("startup")
+async def start_email_outbox_worker():
+    app.state.email_outbox_worker = asyncio.create_task(run_email_outbox_worker())
+
+@app.on_event("shutdown")
+async def stop_email_outbox_worker():
+    app.state.email_outbox_worker.cancel()
+    smtp_pool.close_all()
+
 # Root route
 @app.get("/")
 async def root():
@@ -32,6 +101,7 @@ app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(users.router, prefix="/api", tags=["Users"])
 app.include_router(pizza.router, prefix="/api", tags=["Pizzas"])
 app.include_router(toppings.router, prefix="/api", tags=["Toppings"])
+app.include_router(menu.router, prefix="/api", tags=["Menu"])
 app.include_router(coupons.router, prefix="/api", tags=["Coupons"])
 app.include_router(cart.router, prefix="/api", tags=["Cart"])
 app.include_router(order.router, prefix="/api", tags=["Order"])
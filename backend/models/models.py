@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Numeric, Enum, Text,Float
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, DateTime, Enum, Text, Index, UniqueConstraint, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.types import Date
@@ -25,8 +25,9 @@ class Cart(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     created_at = Column(DateTime, server_default=func.now())
-    total_price = Column(Float, default=0.0)  # Stores the total price of the cart
-    discounted_price = Column(Float, default=0.0)  # Stores the price after applying the coupon
+    total_price_cents = Column(Integer, default=0)  # Stores the total price of the cart, in cents
+    discounted_price_cents = Column(Integer, default=0)  # Stores the price after applying the coupon, in cents
+    coupon_id = Column(Integer, ForeignKey('coupons.id'), nullable=True)  # Coupon redeemed for this cart and not checked out yet
 
     user = relationship("User", back_populates="cart")
     cart_items = relationship("CartItem", back_populates="cart", cascade="all, delete-orphan")
@@ -36,8 +37,8 @@ class CartItem(Base):
     __tablename__ = 'cart_items'
 
     id = Column(Integer, primary_key=True)
-    cart_id = Column(Integer, ForeignKey('carts.id'))
-    pizza_id = Column(Integer, ForeignKey('pizzas.id'))
+    cart_id = Column(Integer, ForeignKey('carts.id'), index=True)  # Per-cart totals are computed in SQL
+    pizza_id = Column(Integer, ForeignKey('pizzas.id'), index=True)  # Finds carts to reprice after a price change
     quantity = Column(Integer)
 
     cart = relationship("Cart", back_populates="cart_items")
@@ -49,8 +50,8 @@ class CartTopping(Base):
     __tablename__ = 'cart_toppings'
 
     id = Column(Integer, primary_key=True)
-    cart_item_id = Column(Integer, ForeignKey('cart_items.id'))
-    topping_id = Column(Integer, ForeignKey('toppings.id'))
+    cart_item_id = Column(Integer, ForeignKey('cart_items.id'), index=True)
+    topping_id = Column(Integer, ForeignKey('toppings.id'), index=True)
     quantity = Column(Integer)
 
     cart_item = relationship("CartItem", back_populates="cart_toppings")
@@ -64,8 +65,10 @@ class Pizza(Base):
     name = Column(String(255))
     description = Column(Text)
     image = Column(String(255))
-    price = Column(Numeric(10, 2))
+    image_variants = Column(JSON)  # Variant name -> URL of the resized/WebP copies of `image`, {} if it cannot be decoded
+    price_cents = Column(Integer)  # Money is stored as integer cents, see services/pricing.py
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  # Part of the order ETag
 
     cart_items = relationship("CartItem", back_populates="pizza")
     order_items = relationship("OrderItem", back_populates="pizza")
@@ -76,8 +79,9 @@ class Topping(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String(255))
-    price = Column(Numeric(10, 2))
+    price_cents = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  # Part of the order ETag
 
     cart_toppings = relationship("CartTopping", back_populates="topping")
     order_toppings = relationship("OrderTopping", back_populates="topping")
@@ -89,7 +93,7 @@ class Order(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     status = Column(Enum('Received', 'Preparing', 'Baking', 'Ready for Pickup', 'Completed', name='order_status'))
-    total_price = Column(Numeric(10, 2))
+    total_price_cents = Column(Integer)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
@@ -97,6 +101,10 @@ class Order(Base):
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     order_coupons = relationship("OrderCoupon", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),  # Keyset pagination for the admin order list
+    )
+
 # OrderItem Model
 class OrderItem(Base):
     __tablename__ = 'order_items'
@@ -139,9 +147,9 @@ class Coupon(Base):
 
     id = Column(Integer, primary_key=True)
     code = Column(String(50), unique=True)
-    discount = Column(Numeric(5, 2))
+    discount_cents = Column(Integer)  # Flat discount, in cents
     expiration_date = Column(Date)
-    usage_limit = Column(Integer)
+    usage_limit = Column(Integer)  # Remaining redemptions across all users (NULL = unlimited)
     created_at = Column(DateTime, server_default=func.now())
 
     coupon_usages = relationship("CouponUsage", back_populates="coupon")
@@ -161,4 +169,36 @@ class CouponUsage(Base):
     user = relationship("User", back_populates="coupon_usages")
     coupon = relationship("Coupon", back_populates="coupon_usages")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "coupon_id", name="uq_user_coupon_usage_user_coupon"),  # Target for redemption upserts
+    )
+
+# RevokedToken Model
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String(64), unique=True, nullable=False)  # Token id from the JWT 'jti' claim
+    expires_at = Column(DateTime, nullable=False, index=True)  # Row can be purged after the token expires
+    revoked_at = Column(DateTime, server_default=func.now())
+
+# EmailOutbox Model
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)  # HTML
+    status = Column(Enum('Pending', 'Sent', 'Failed', name='email_status'), nullable=False, default='Pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, server_default=func.now())  # Also pushed forward while a worker holds the message
+    last_error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),  # Worker picks due pending messages
+    )
+
 
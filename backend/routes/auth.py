@@ -1,32 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.auth import RegistrationRequest, LoginRequest, LoginResponse
-from services.auth import register_user, authenticate_user,generate_new_access_token
+from services.auth import register_user, authenticate_user,generate_new_access_token, revoke_access_token
+from core.auth import oauth2_scheme
 from db.config import get_db
 from fastapi.security import OAuth2PasswordRequestForm
 router = APIRouter()
 
 @router.post("/register", response_model=dict)
-async def register(user_data: RegistrationRequest, db: Session = Depends(get_db)):
+async def register(user_data: RegistrationRequest, db: AsyncSession = Depends(get_db)):
     new_user =  await register_user(user_data, db)  
     return {"message": "User registered successfully","data":new_user}
 
 @router.post("/login", response_model=LoginResponse)
-async def login(login_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(login_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     loged_user = await authenticate_user(login_data, db)
     return loged_user  
 
 @router.post("/refresh")
-async def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
     """
     Refresh the access token using a valid refresh token.
     """
     try:
         # Call service function to process the refresh token
-        new_access_token = generate_new_access_token(refresh_token, db)
+        new_access_token = await generate_new_access_token(refresh_token, db)
         return {
             "access_token": new_access_token,
             "token_type": "bearer"
         }
     except HTTPException as e:
-        raise e
\ No newline at end of file
+        raise e
+
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """
+    Revoke the current access token.
+    """
+    revoked = await revoke_access_token(token, db)
+    return {"message": "Logged out successfully", "data": revoked}
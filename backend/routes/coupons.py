@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.coupons import CouponCreate, CouponResponse
 from services.coupons import (
     create_new_coupon,
@@ -7,10 +7,12 @@ from services.coupons import (
     get_coupon_by_id,
     update_existing_coupon,
     delete_coupon,
-    get_user_active_coupons
+    get_user_active_coupons,
+    serialize_coupon
 )
 from db.config import get_db
 from utils.dependencies import admin_required,user_required
+from utils.http_cache import cache_headers, encode_json, etag_for, is_not_modified, not_modified
 
 router = APIRouter(prefix="/coupons")
 
@@ -18,37 +20,42 @@ router = APIRouter(prefix="/coupons")
 
 # Create Coupon (Admin Only)
 @router.post("/", dependencies=[Depends(admin_required)])
-async def create_new_coupons(coupon: CouponCreate, db: Session = Depends(get_db)):
+async def create_new_coupons(coupon: CouponCreate, db: AsyncSession = Depends(get_db)):
     new_coupon = await create_new_coupon(coupon, db)
-    return {"message": "Coupon created successfully", "data": new_coupon}
+    return {"message": "Coupon created successfully", "data": serialize_coupon(new_coupon)}
 
 # Get Coupons Available for User
 @router.get("/", dependencies=[Depends(user_required)])
-async def get_user_coupons(db: Session = Depends(get_db), current_user: dict = Depends(user_required)):
+async def get_user_coupons(request: Request, db: AsyncSession = Depends(get_db), current_user: dict = Depends(user_required)):
     coupons = await get_user_active_coupons(user_id=current_user.id, db=db)
-    return {"message": "Coupons retrieved successfully", "data": coupons}
+    # The list depends on the user's redemptions, so the ETag covers the encoded body
+    body = encode_json({"message": "Coupons retrieved successfully", "data": coupons})
+    etag = etag_for(body)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type="application/json", headers=cache_headers(etag))
 
 
 # Get All Coupons (Admin Only)
 @router.get("/all", dependencies=[Depends(admin_required)])
-async def get_all_coupon_data(db: Session = Depends(get_db)):
+async def get_all_coupon_data(db: AsyncSession = Depends(get_db)):
     coupons = await get_all_coupons(db)
-    return {"message": "All coupons retrieved successfully", "data": coupons}
+    return {"message": "All coupons retrieved successfully", "data": [serialize_coupon(coupon) for coupon in coupons]}
 
 # Get Coupon by ID
 @router.get("/{coupon_id}")
-async def get_coupon_details(coupon_id: int, db: Session = Depends(get_db)):
+async def get_coupon_details(coupon_id: int, db: AsyncSession = Depends(get_db)):
     coupon = await get_coupon_by_id(coupon_id, db)
-    return {"message": "Coupon retrieved successfully", "data": coupon}
+    return {"message": "Coupon retrieved successfully", "data": serialize_coupon(coupon)}
 
 # Update Coupon (Admin Only)
 @router.put("/{coupon_id}", dependencies=[Depends(admin_required)])
-async def update_coupon(coupon_id: int, coupon: CouponCreate, db: Session = Depends(get_db)):
+async def update_coupon(coupon_id: int, coupon: CouponCreate, db: AsyncSession = Depends(get_db)):
     updated_coupon = await update_existing_coupon(coupon_id, coupon, db)
-    return {"Message": "Coupon Updated Successfully", "data": updated_coupon}
+    return {"Message": "Coupon Updated Successfully", "data": serialize_coupon(updated_coupon)}
 
 # Delete Coupon (Admin Only)
 @router.delete("/{coupon_id}", response_model=dict, dependencies=[Depends(admin_required)])
-async def remove_coupon(coupon_id: int, db: Session = Depends(get_db)):
+async def remove_coupon(coupon_id: int, db: AsyncSession = Depends(get_db)):
     deleted_coupon = await delete_coupon(coupon_id, db)
     return {"Message": "Coupon Deleted Successfully", "data": deleted_coupon}
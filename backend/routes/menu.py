@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.config import get_db
+from services.menu import get_user_menu
+from utils.dependencies import optional_user
+from utils.http_cache import PRIVATE_REVALIDATE, PUBLIC_SHORT_CACHE, cache_headers, is_not_modified, not_modified
+
+router = APIRouter()
+
+
+# Pizzas, toppings and the caller's active coupons in one response (coupons are empty when anonymous)
+@router.get("/menu")
+async def get_menu(request: Request, db: AsyncSession = Depends(get_db), current_user=Depends(optional_user)):
+    body, etag = await get_user_menu(current_user.id if current_user else None, db)
+    cache_control = PRIVATE_REVALIDATE if current_user else PUBLIC_SHORT_CACHE
+    headers = {**cache_headers(etag, cache_control=cache_control), "Vary": "Authorization"}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,60 +1,139 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.order import OrderResponse, OrderItemResponse
+from services.cart import get_cart, schedule_order_progress
 from services.order import (
     create_order,
     get_order_by_id,
+    get_order_owner_id,
+    get_order_version,
+    order_last_modified,
     get_all_orders,
     get_all_orders_for_user,
     delete_order_for_admin,
-    update_order_status_for_admin
+    update_order_status_for_admin,
+    stream_orders_export,
+    stream_order_status,
 )
 from db.config import get_db
+from core.config import settings
 from utils.dependencies import admin_required, user_required
+from utils.http_cache import cache_headers, etag_for, is_not_modified, not_modified
 
 router = APIRouter(prefix="/orders")
 
 # Create an Order (Checkout)
 @router.post("/", dependencies=[Depends(user_required)])
-async def place_order(order_data: OrderItemResponse, db: Session = Depends(get_db)):
-    order = await create_order(order_data.cart_id, db)
+async def place_order(db: AsyncSession = Depends(get_db), current_user=Depends(user_required)):
+    # Always the caller's own cart, a cart id from the request could name anyone's
+    cart = await get_cart(current_user.id, db)
+    order = await create_order(cart["cart_id"], db)
+    schedule_order_progress(order.id)
     return {"message": "Order placed successfully", "data": order}
 
 
 # Get All Orders (Admin Only)
 @router.get("/all", dependencies=[Depends(admin_required)])
-async def get_orders(db: Session = Depends(get_db)):
+async def get_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.ORDERS_PAGE_SIZE, ge=1, le=settings.ORDERS_MAX_PAGE_SIZE),
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        # Call the service function to fetch orders
-        response = await get_all_orders(db)
+        # Call the service function to fetch one page of orders
+        response = await get_all_orders(
+            db,
+            cursor=cursor,
+            limit=limit,
+            status=status,
+            created_from=created_from,
+            created_to=created_to,
+        )
         
         # If no orders are found, this will be handled in the service function itself
         if response["message"] == "No orders found.":
-            return {"message": response["message"], "data": []}
+            return {"message": response["message"], "data": [], "next_cursor": None}
         
         # Otherwise, return the successful response with data
         return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving orders: {str(e)}")
 
 
 # Get All Orders for a Specific User (User Only)
 @router.get("/my-orders", dependencies=[Depends(user_required)])
-async def get_user_orders(db: Session = Depends(get_db), current_user=Depends(user_required)):
+async def get_user_orders(db: AsyncSession = Depends(get_db), current_user=Depends(user_required)):
     orders = await get_all_orders_for_user(current_user.id, db)
     return {"message": "User orders retrieved successfully", "data": orders}
 
 
+# Export Orders as NDJSON or CSV (Admin Only)
+@router.get("/export", dependencies=[Depends(admin_required)])
+async def export_orders(
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_orders_export(format, created_from, created_to),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=orders.{format}"},
+    )
+
+
 # Get Order by ID (User & Admin)
 @router.get("/{order_id}")
-async def get_order(order_id: int, db: Session = Depends(get_db)):
+async def get_order(order_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    # Validate against the order row and its menu items before loading items and toppings
+    version = await get_order_version(order_id, db)
+    if version:
+        etag = etag_for(
+            "order",
+            order_id,
+            version.status,
+            version.updated_at,
+            version.total_price_cents,
+            version.pizzas_updated_at,
+            version.toppings_updated_at,
+        )
+        last_modified = order_last_modified(version)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified(etag, last_modified)
+        response.headers.update(cache_headers(etag, last_modified))
+
     order = await get_order_by_id(order_id, db)
     return {"message": "Order retrieved successfully", "data": order}
 
+# Live order status as server-sent events, instead of polling the order
+@router.get("/{order_id}/events")
+async def order_status_events(order_id: int, db: AsyncSession = Depends(get_db), current_user=Depends(user_required)):
+    owner_id = await get_order_owner_id(order_id, db)
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Order not found.")
+    if current_user.role != "admin" and owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to follow this order.")
+    # The stream outlives the request dependencies, hand the connection back before it starts
+    await db.close()
+
+    return StreamingResponse(
+        stream_order_status(order_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Update Order Status (Admin Only)
 @router.put("/{order_id}/status", dependencies=[Depends(admin_required)])
-async def update_order_status(order_id: int, new_status: str, db: Session = Depends(get_db)):
+async def update_order_status(order_id: int, new_status: str, db: AsyncSession = Depends(get_db)):
     result = await update_order_status_for_admin(order_id, new_status, db)
     if result["message"] == "Order status updated successfully":
         return result
@@ -64,7 +143,7 @@ async def update_order_status(order_id: int, new_status: str, db: Session = Depe
 
 # Delete Order for Admin (Admin Only)
 @router.delete("/{order_id}", dependencies=[Depends(admin_required)])
-async def delete_order(order_id: int, db: Session = Depends(get_db)):
+async def delete_order(order_id: int, db: AsyncSession = Depends(get_db)):
     result = await delete_order_for_admin(order_id, db)
     if result["message"] == "Order deleted successfully.":
         return {"message": "Order deleted successfully."}
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException ,File, UploadFile,Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException ,File, UploadFile,Body, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from db.config import get_db
 from services.pizza import (
     get_all_pizzas,
@@ -7,21 +7,32 @@ from services.pizza import (
     create_pizza,
     update_pizza,
     delete_pizza,
+    serialize_pizza,
 )
 from schemas.pizza import PizzaCreateUpdate, PizzaResponse
 from utils.dependencies import admin_required
+from services.pricing import run_cart_repricing
+from services.menu import get_menu_snapshot
+from utils.http_cache import PUBLIC_SHORT_CACHE, cache_headers, is_not_modified, not_modified
 
 router = APIRouter()
 
 @router.get("/pizzas")
-async def list_pizzas(db: Session = Depends(get_db)):
-    pizzas = await get_all_pizzas(db)
-    return {"Message" : "Pizza geted successfully","data":pizzas}
+async def list_pizzas(request: Request, db: AsyncSession = Depends(get_db)):
+    # Served from the in-memory menu snapshot, the database is only read after a menu change
+    snapshot = await get_menu_snapshot(db)
+    if is_not_modified(request, snapshot.pizzas_etag):
+        return not_modified(snapshot.pizzas_etag, cache_control=PUBLIC_SHORT_CACHE)
+    return Response(
+        content=snapshot.pizzas,
+        media_type="application/json",
+        headers=cache_headers(snapshot.pizzas_etag, cache_control=PUBLIC_SHORT_CACHE),
+    )
 
 @router.get("/pizzas/{pizza_id}")
-async def retrieve_pizza(pizza_id: int, db: Session = Depends(get_db)):
+async def retrieve_pizza(pizza_id: int, db: AsyncSession = Depends(get_db)):
     pizza = await get_pizza_by_id(pizza_id, db)
-    return {"Message" : "Pizza geted successfully","data":pizza}
+    return {"Message" : "Pizza geted successfully","data":serialize_pizza(pizza)}
 
 @router.post("/pizzas",dependencies=[Depends(admin_required)])
 async def create_new_pizza(
@@ -29,7 +40,7 @@ async def create_new_pizza(
     description: str = Body(...),
     price: float = Body(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Create new pizza and get the saved pizza ORM object
     new_pizza = await create_pizza(name, description, price, file, db)
@@ -37,16 +48,19 @@ async def create_new_pizza(
     # Return a structured response with a message and data
     return {
         "message": "Pizza created successfully.",
-        "data": new_pizza
+        "data": serialize_pizza(new_pizza)
     }
 
 @router.put("/pizzas/{pizza_id}", dependencies=[Depends(admin_required)])
-async def update_existing_pizza(pizza_id: int, pizza: PizzaCreateUpdate, db: Session = Depends(get_db)):
+async def update_existing_pizza(pizza_id: int, pizza: PizzaCreateUpdate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     updated_pizza = await update_pizza(pizza_id, pizza, db)
-    return {"Message" : "Pizza Updated successfully","data":updated_pizza}
+    # Carts holding this pizza are repriced after the response is sent
+    if pizza.price is not None:
+        background_tasks.add_task(run_cart_repricing, pizza_ids=[pizza_id])
+    return {"Message" : "Pizza Updated successfully","data":serialize_pizza(updated_pizza)}
 
 
 @router.delete("/pizzas/{pizza_id}", dependencies=[Depends(admin_required)])
-async def delete_existing_pizza(pizza_id: int, db: Session = Depends(get_db)):
+async def delete_existing_pizza(pizza_id: int, db: AsyncSession = Depends(get_db)):
     deleted_pizza = await delete_pizza(pizza_id, db)
     return {"Message" : "Pizza Deleted successfully","data":deleted_pizza}
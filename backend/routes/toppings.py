@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from schemas.toppings import ToppingCreate, ToppingResponse
 from services.toppings import (
     create_new_topping,
@@ -7,34 +7,47 @@ from services.toppings import (
     get_topping_by_id,
     update_existing_topping,
     delete_topping,
+    serialize_topping,
 )
 from db.config import get_db
 from utils.dependencies import admin_required
+from services.pricing import run_cart_repricing
+from services.menu import get_menu_snapshot
+from utils.http_cache import PUBLIC_SHORT_CACHE, cache_headers, is_not_modified, not_modified
 
 router = APIRouter(prefix="/toppings")
 
 @router.post("/",dependencies=[Depends(admin_required)])
-async def create_topping(topping: ToppingCreate, db: Session = Depends(get_db)):
+async def create_topping(topping: ToppingCreate, db: AsyncSession = Depends(get_db)):
     new_topping = await create_new_topping(topping, db)
-    return {"Message":"Topping Created Successfull","data":new_topping}
+    return {"Message":"Topping Created Successfull","data":serialize_topping(new_topping)}
 
 @router.get("/")
-async def list_toppings(db: Session = Depends(get_db)):
-    toppings = await get_all_toppings(db)
-    return {"Message":"Toppings geted Successfull","data":toppings}
+async def list_toppings(request: Request, db: AsyncSession = Depends(get_db)):
+    # Served from the in-memory menu snapshot, the database is only read after a menu change
+    snapshot = await get_menu_snapshot(db)
+    if is_not_modified(request, snapshot.toppings_etag):
+        return not_modified(snapshot.toppings_etag, cache_control=PUBLIC_SHORT_CACHE)
+    return Response(
+        content=snapshot.toppings,
+        media_type="application/json",
+        headers=cache_headers(snapshot.toppings_etag, cache_control=PUBLIC_SHORT_CACHE),
+    )
 
 @router.get("/{topping_id}")
-async def get_topping(topping_id: int, db: Session = Depends(get_db)):
+async def get_topping(topping_id: int, db: AsyncSession = Depends(get_db)):
     topping = await get_topping_by_id(topping_id, db)
-    return {"Message":" Topping geted Successfull","data":topping}
+    return {"Message":" Topping geted Successfull","data":serialize_topping(topping)}
 
 
 @router.put("/{topping_id}",dependencies=[Depends(admin_required)])
-async def update_topping(topping_id: int, topping: ToppingCreate, db: Session = Depends(get_db)):
+async def update_topping(topping_id: int, topping: ToppingCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db)):
     updated_topping = await update_existing_topping(topping_id, topping, db)
-    return {"Message":"Topping Updated Successfull","data":updated_topping}
+    # Carts holding this topping are repriced after the response is sent
+    background_tasks.add_task(run_cart_repricing, topping_ids=[topping_id])
+    return {"Message":"Topping Updated Successfull","data":serialize_topping(updated_topping)}
 
 @router.delete("/{topping_id}", response_model=dict,dependencies=[Depends(admin_required)])
-async def remove_topping(topping_id: int, db: Session = Depends(get_db)):
+async def remove_topping(topping_id: int, db: AsyncSession = Depends(get_db)):
     deleted_topping = await delete_topping(topping_id, db)
     return {"Message":"Topping Successfull","data":deleted_topping}
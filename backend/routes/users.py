@@ -1,8 +1,12 @@
 # app/routes/admin.py
 from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.auth import register_user  # Assuming this function handles user registration
 from utils.dependencies import admin_required  # Admin check dependency
+from utils.jwt import principal_cache
+from services.auth import password_hash_pool
+from utils.catalog import menu_catalog
+from utils.event_bus import event_bus
 from db.config import get_db
 from schemas.auth import RegistrationRequest  # Assuming your schema for registration is here
 from services.users import get_all_users, get_user_details, get_user_orders ,create_admin_service # Assuming these functions handle user operations
@@ -10,7 +14,7 @@ router = APIRouter()
 
 # Create new admin (accessible only by admins)
 @router.post("/create_admin", dependencies=[Depends(admin_required)])
-async def create_admin(admin_data: RegistrationRequest, db: Session = Depends(get_db)):
+async def create_admin(admin_data: RegistrationRequest, db: AsyncSession = Depends(get_db)):
     try:
         # Call the service function to create a new admin
         new_admin = await create_admin_service(admin_data, db)
@@ -22,7 +26,7 @@ async def create_admin(admin_data: RegistrationRequest, db: Session = Depends(ge
 
 # Fetch all users (only accessible by admins)
 @router.get("/users", dependencies=[Depends(admin_required)])
-async def fetch_all_users(db: Session = Depends(get_db)):
+async def fetch_all_users(db: AsyncSession = Depends(get_db)):
     try:
         users = await get_all_users(db)
         return {"message": "All users fetched successfully", "data": users}
@@ -31,7 +35,7 @@ async def fetch_all_users(db: Session = Depends(get_db)):
 
 # Fetch details of a specific user (only accessible by admins)
 @router.get("/users/{user_id}", dependencies=[Depends(admin_required)])
-async def fetch_user_by_id(user_id: int, db: Session = Depends(get_db)):
+async def fetch_user_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
         user = await get_user_details(user_id, db)
         return {"message": f"User {user_id} fetched successfully", "data": user}
@@ -40,9 +44,29 @@ async def fetch_user_by_id(user_id: int, db: Session = Depends(get_db)):
 
 # Fetch orders for a specific user (only accessible by admins)
 @router.get("/users/{user_id}/orders", dependencies=[Depends(admin_required)])
-async def fetch_user_orders(user_id: int, db: Session = Depends(get_db)):
+async def fetch_user_orders(user_id: int, db: AsyncSession = Depends(get_db)):
     try:
         orders = await get_user_orders(user_id, db)
         return {"message": f"Orders for user {user_id} fetched successfully", "data": orders}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching orders for user {user_id}: {str(e)}")
+
+# Principal cache hit/miss counters (only accessible by admins)
+@router.get("/users/cache/stats", dependencies=[Depends(admin_required)])
+async def fetch_principal_cache_stats():
+    return {"message": "Principal cache stats fetched successfully", "data": principal_cache.stats()}
+
+# Password hashing pool queue depth and rejections (only accessible by admins)
+@router.get("/users/hashing/stats", dependencies=[Depends(admin_required)])
+async def fetch_password_hash_stats():
+    return {"message": "Password hashing stats fetched successfully", "data": password_hash_pool.stats()}
+
+# Menu catalog snapshot version and rebuilds (only accessible by admins)
+@router.get("/users/menu-cache/stats", dependencies=[Depends(admin_required)])
+async def fetch_menu_cache_stats():
+    return {"message": "Menu cache stats fetched successfully", "data": menu_catalog.stats()}
+
+
+@router.get("/users/event-bus/stats", dependencies=[Depends(admin_required)])
+async def fetch_event_bus_stats():
+    return {"message": "Event bus stats fetched successfully", "data": event_bus.stats()}
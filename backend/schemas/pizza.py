@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, Optional
 
 # Request schema for creating or updating a pizza
 class PizzaCreateUpdate(BaseModel):
@@ -13,6 +13,7 @@ class PizzaResponse(BaseModel):
     name: str
     description: Optional[str]
     image: Optional[str]
+    image_variants: Optional[Dict[str, str]]
     price: float
 
     class Config:
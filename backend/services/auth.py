@@ -1,24 +1,36 @@
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from utils.jwt import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY, create_access_token, create_refresh_token, verify_token
-from models.models import Coupon, CouponUsage, User
+from models.models import User
 from schemas.auth import LoginRequest, LoginResponse, RegistrationRequest
+from utils.revocation import token_deny_list
+from utils.worker_pool import BoundedWorkerPool
+from core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is CPU-bound, so it runs in a bounded pool instead of on the event loop
+password_hash_pool = BoundedWorkerPool(
+    "password-hash",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
 async def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return await password_hash_pool.run(pwd_context.hash, password)
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
 
-async def register_user(user_data: RegistrationRequest, db: Session):
+async def register_user(user_data: RegistrationRequest, db: AsyncSession):
     try:
         # Check if the email is already registered
-        if db.query(User).filter(User.email == user_data.email).first():
+        result = await db.execute(select(User).filter(User.email == user_data.email))
+        if result.scalars().first():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered",
@@ -36,25 +48,16 @@ async def register_user(user_data: RegistrationRequest, db: Session):
         role="user",
     )
     
-    # Add the new user to the database
+    # Add the new user to the database; coupon usage rows are created when a coupon is applied
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Fetch all existing coupons
-    existing_coupons = db.query(Coupon).all()
-
-    # Assign each coupon to the new user
-    for coupon in existing_coupons:
-        coupon_usage = CouponUsage(user_id=user.id, coupon_id=coupon.id)
-        db.add(coupon_usage)
-    
-    db.commit()
+    await db.commit()
+    await db.refresh(user)
     return user
 
-async def authenticate_user(login_data, db: Session):
+async def authenticate_user(login_data, db: AsyncSession):
     # Find user by email
-    user = db.query(User).filter(User.email == login_data.username).first()
+    result = await db.execute(select(User).filter(User.email == login_data.username))
+    user = result.scalars().first()
 
     # If user not found or password is incorrect, raise error
     if not user or not await verify_password(login_data.password, user.password):
@@ -64,7 +67,7 @@ async def authenticate_user(login_data, db: Session):
         )
 
     # Create JWT tokens
-    access_token = create_access_token({"sub": user.email, "role": user.role, "username": user.name})
+    access_token = create_access_token({"sub": user.email, "uid": user.id, "role": user.role, "username": user.name})
     refresh_token = create_refresh_token({"sub": user.email})
 
     # Return login response with user details
@@ -76,7 +79,7 @@ async def authenticate_user(login_data, db: Session):
         role=user.role,  # Include the role
     )
 
-def generate_new_access_token(refresh_token: str, db: Session) -> str:
+async def generate_new_access_token(refresh_token: str, db: AsyncSession) -> str:
     """
     Validate the refresh token and generate a new access token.
     """
@@ -92,7 +95,8 @@ def generate_new_access_token(refresh_token: str, db: Session) -> str:
             )
 
         # Query the user from the database using the email
-        user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
 
         if not user:
             raise HTTPException(
@@ -102,10 +106,9 @@ def generate_new_access_token(refresh_token: str, db: Session) -> str:
 
         # Generate a new access token
         access_token_expiry = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        new_access_token = jwt.encode(
-            {"sub": user.email, "role": user.role, "exp": datetime.utcnow() + access_token_expiry},
-            SECRET_KEY,
-            algorithm=ALGORITHM
+        new_access_token = create_access_token(
+            {"sub": user.email, "uid": user.id, "role": user.role, "username": user.name},
+            access_token_expiry,
         )
 
         return new_access_token
@@ -114,4 +117,19 @@ def generate_new_access_token(refresh_token: str, db: Session) -> str:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token"
-        )
\ No newline at end of file
+        )
+
+async def revoke_access_token(token: str, db: AsyncSession):
+    """
+    Revoke an access token by adding its 'jti' to the deny-list.
+    """
+    payload = verify_token(token)
+    jti = payload.get("jti")
+    if not jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Token cannot be revoked"
+        )
+
+    await token_deny_list.revoke(jti, datetime.utcfromtimestamp(payload["exp"]), db)
+    return {"jti": jti, "revoked": True}
@@ -1,38 +1,68 @@
+import asyncio
 from datetime import datetime
 import time
 from decimal import Decimal
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from typing import Iterable, List
+from sqlalchemy import case, func, select, delete, insert, update
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from models.models import Cart, CartItem, CartTopping, Order, OrderItem, Coupon, CouponUsage,OrderTopping
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import Cart, CartItem, CartTopping, Order, OrderItem, OrderCoupon, Coupon, CouponUsage,OrderTopping
 from schemas.cart import CartItemCreate, CartToppingCreate
 from schemas.order import OrderCreate
+from services.coupons import get_coupon_by_code, redeem_coupon
+from services.email import notify_email_outbox, queue_order_confirmation
+from services.pricing import apply_cart_delta, apply_discount, cart_line_amount, from_cents, line_cents, price_cart
+from utils.timer_wheel import TimerWheel
+from utils.pubsub import order_events
+from utils.event_bus import event_bus
 from sqlalchemy import func
 
+# Eager loading for the cart graph, lazy loads are not available on AsyncSession
+CART_GRAPH_OPTIONS = (
+    selectinload(Cart.cart_items).selectinload(CartItem.pizza),
+    selectinload(Cart.cart_items).selectinload(CartItem.cart_toppings).selectinload(CartTopping.topping),
+)
+
+
+
+# Cart totals for responses, money columns are converted from cents
+def serialize_cart(cart: Cart):
+    return {
+        "id": cart.id,
+        "user_id": cart.user_id,
+        "created_at": cart.created_at,
+        "total_price": from_cents(cart.total_price_cents),
+        "discounted_price": from_cents(cart.discounted_price_cents),
+    }
 
 
-async def create_cart(user_id: int, db: Session):
+async def create_cart(user_id: int, db: AsyncSession):
     try:
         cart = Cart(user_id=user_id)
         db.add(cart)
-        db.commit()
-        db.refresh(cart)
+        await db.commit()
+        await db.refresh(cart)
         return cart
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error creating cart: {str(e)}")
 
 # Add an item to the cart
-async def add_item_to_cart(user_id: int, cart_item: CartItemCreate, db: Session):
+async def add_item_to_cart(user_id: int, cart_item: CartItemCreate, db: AsyncSession):
     try:
-        cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+        result = await db.execute(select(Cart).filter(Cart.user_id == user_id))
+        cart = result.scalars().first()
         if not cart:
             cart = await create_cart(user_id, db)
         
-        cart_item_obj = db.query(CartItem).filter(
+        result = await db.execute(select(CartItem).filter(
             CartItem.cart_id == cart.id,
             CartItem.pizza_id == cart_item.pizza_id
-        ).first()
+        ))
+        cart_item_obj = result.scalars().first()
 
         if cart_item_obj:
             cart_item_obj.quantity += cart_item.quantity
@@ -43,14 +73,14 @@ async def add_item_to_cart(user_id: int, cart_item: CartItemCreate, db: Session)
                 quantity=cart_item.quantity
             )
             db.add(cart_item_obj)
-            db.commit()
-            db.refresh(cart_item_obj)
+            await db.flush()
 
         for topping in cart_item.toppings:
-            existing_topping = db.query(CartTopping).filter(
+            result = await db.execute(select(CartTopping).filter(
                 CartTopping.cart_item_id == cart_item_obj.id,
                 CartTopping.topping_id == topping.topping_id
-            ).first()
+            ))
+            existing_topping = result.scalars().first()
             if existing_topping:
                 existing_topping.quantity += topping.quantity
             else:
@@ -61,32 +91,44 @@ async def add_item_to_cart(user_id: int, cart_item: CartItemCreate, db: Session)
                 )
                 db.add(cart_topping)
 
-        db.commit()
-        db.refresh(cart)
-        await update_cart_total_price(cart.id, db)
+        # Only the added pizza and toppings change the total, apply them as a delta in the same transaction
+        delta = await cart_line_amount(
+            cart_item.pizza_id,
+            cart_item.quantity,
+            [(topping.topping_id, topping.quantity) for topping in cart_item.toppings],
+            db,
+        )
+        await apply_cart_delta(cart.id, delta, db)
+        await db.commit()
 
         return cart_item_obj
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error adding item to cart: {str(e)}")
 
 
 # Add topping to cart item
-async def add_topping_to_cart(cart_item_id: int, topping_id: int, quantity: int, db: Session):
+async def add_topping_to_cart(cart_item_id: int, topping_id: int, quantity: int, db: AsyncSession):
     try:
         cart_topping = CartTopping(cart_item_id=cart_item_id, topping_id=topping_id, quantity=quantity)
         db.add(cart_topping)
-        db.commit()
-        db.refresh(cart_topping)
+        await db.commit()
+        await db.refresh(cart_topping)
         return cart_topping
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error adding topping to cart: {str(e)}")
     
-async def get_cart(user_id: int, db: Session):
+async def get_cart(user_id: int, db: AsyncSession):
     try:
         # Fetch the user's cart
-        cart = db.query(Cart).filter(Cart.user_id == user_id).first()
+        result = await db.execute(
+            select(Cart)
+            .options(*CART_GRAPH_OPTIONS)
+            .filter(Cart.user_id == user_id)
+            .execution_options(populate_existing=True)
+        )
+        cart = result.scalars().first()
         if not cart:
             raise Exception("No active cart found for this user.")
 
@@ -95,14 +137,14 @@ async def get_cart(user_id: int, db: Session):
         for cart_item in cart.cart_items:
             # Get the price and name of each cart item
             pizza = cart_item.pizza
-            item_price = pizza.price
+            item_price = from_cents(pizza.price_cents)
             pizza_name = pizza.name
 
             # Fetch toppings for this item
             toppings = []
             for cart_topping in cart_item.cart_toppings:
                 topping = cart_topping.topping
-                topping_price = topping.price * cart_topping.quantity
+                topping_price = from_cents(topping.price_cents * cart_topping.quantity)
                 topping_name = topping.name
 
                 # Include topping details
@@ -128,223 +170,385 @@ async def get_cart(user_id: int, db: Session):
             "user_id": cart.user_id,
             "created_at": cart.created_at,
             "items": cart_items,
-            "total_price": cart.total_price,
-            "discounted_price": cart.discounted_price
+            "total_price": from_cents(cart.total_price_cents),
+            "discounted_price": from_cents(cart.discounted_price_cents)
         }
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error retrieving cart: {str(e)}")
 
 
 # Apply a coupon to the cart
-async def apply_coupon_to_cart(cart_id: int, coupon_code: str, db: Session):
+async def apply_coupon_to_cart(cart_id: int, coupon_code: str, db: AsyncSession):
     try:
-        coupon = db.query(Coupon).filter(Coupon.code == coupon_code).first()
+        coupon = await get_coupon_by_code(coupon_code, db)
         if not coupon:
             raise Exception("Coupon not found or expired.")
 
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
+        result = await db.execute(select(Cart).filter(Cart.id == cart_id))
+        cart = result.scalars().first()
         if not cart:
             raise Exception("Cart not found.")
 
-        user = cart.user
-        coupon_usage = db.query(CouponUsage).filter(
-            CouponUsage.user_id == user.id,
-            CouponUsage.coupon_id == coupon.id
-        ).first()
-
-        if coupon_usage and coupon_usage.usage_limit == 0:
-            raise Exception("Coupon already used by this user.")
-
-        total_price_decimal = Decimal(str(cart.total_price))
-        discount_amount = Decimal(str(coupon.discount))
-        cart.discounted_price = total_price_decimal - discount_amount
-
-        if not coupon_usage:
-            coupon_usage = CouponUsage(
-                user_id=user.id,
+        # Attach the coupon to the cart only if it has none, so concurrent applies cannot stack discounts
+        result = await db.execute(
+            update(Cart)
+            .filter(Cart.id == cart_id, Cart.coupon_id.is_(None))
+            .values(
                 coupon_id=coupon.id,
-                usage_limit=0,
-                used_at=datetime.utcnow()
+                discounted_price_cents=apply_discount(cart.total_price_cents or 0, coupon.discount_cents or 0),
             )
-            db.add(coupon_usage)
-        else:
-            coupon_usage.usage_limit = 0
-            coupon_usage.used_at = datetime.utcnow()
-
-        db.commit()
-        db.refresh(cart)
-        return cart
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            await db.rollback()
+            raise Exception("A coupon is already applied to this cart.")
+
+        try:
+            await redeem_coupon(cart.user_id, coupon.id, db)
+        except Exception:
+            await db.rollback()
+            raise
+
+        await db.commit()
+        await db.refresh(cart)
+        return serialize_cart(cart)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error applying coupon to cart: {str(e)}")
 
 
+# Detach a cart's coupon and give its redemption back, inside the caller's transaction
+async def release_cart_coupon(cart: Cart, db: AsyncSession) -> bool:
+    """
+    Returns False if the cart no longer holds the coupon. The write is conditional:
+    only one removal wins, and a checkout that already consumed the coupon has
+    cleared it, so a redemption used by an order is never given back.
+    """
+    coupon_id = cart.coupon_id
+    if coupon_id is None:
+        return False
+    result = await db.execute(
+        update(Cart)
+        .filter(Cart.id == cart.id, Cart.coupon_id == coupon_id)
+        .values(coupon_id=None, discounted_price_cents=Cart.total_price_cents)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        return False
+
+    await db.execute(
+        update(CouponUsage)
+        .filter(
+            CouponUsage.user_id == cart.user_id,
+            CouponUsage.coupon_id == coupon_id,
+            CouponUsage.usage_limit == 0,
+        )
+        .values(usage_limit=1, used_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(Coupon)
+        .filter(Coupon.id == coupon_id, Coupon.usage_limit.isnot(None))
+        .values(usage_limit=Coupon.usage_limit + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
 # Remove a coupon from the cart
-async def remove_coupon_from_cart(cart_id: int, db: Session):
+async def remove_coupon_from_cart(cart_id: int, db: AsyncSession):
     try:
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
+        result = await db.execute(select(Cart).filter(Cart.id == cart_id))
+        cart = result.scalars().first()
         if not cart:
             raise Exception("Cart not found.")
 
-        user = cart.user
-        coupon_usage = db.query(CouponUsage).filter(
-            CouponUsage.user_id == user.id,
-            CouponUsage.usage_limit == 0
-        ).first()
-
-        if not coupon_usage:
+        if not await release_cart_coupon(cart, db):
+            await db.rollback()
             raise Exception("No coupon applied to this cart.")
 
-        discount_amount = cart.discounted_price + float(coupon_usage.coupon.discount)
-        cart.discounted_price = discount_amount
-        coupon_usage.usage_limit = 1
-        coupon_usage.used_at = None
-
-        db.commit()
+        await db.commit()
         return {
             "cart_id": cart.id,
-            "recalculated_total": cart.total_price,
+            "recalculated_total": from_cents(cart.total_price_cents),
         }
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error removing coupon from cart: {str(e)}")
 
 
 
 # Update the quantity of an item in the cart
-async def update_cart_item(cart_item_id: int, updated_cart_Quantity: int, db: Session):
+async def update_cart_item(cart_item_id: int, updated_cart_Quantity: int, db: AsyncSession):
     try:
-        cart_item = db.query(CartItem).filter(CartItem.id == cart_item_id).first()
+        result = await db.execute(select(CartItem).filter(CartItem.id == cart_item_id))
+        cart_item = result.scalars().first()
         if not cart_item:
             raise Exception("Cart item not found.")
 
+        # Toppings are priced on their own quantity, so only the pizza part of the line changes
+        delta = await cart_line_amount(cart_item.pizza_id, updated_cart_Quantity - cart_item.quantity, [], db)
+
         # Update the quantity of the cart item
         cart_item.quantity = updated_cart_Quantity
-        db.commit()
-        db.refresh(cart_item)
+        await apply_cart_delta(cart_item.cart_id, delta, db)
+        await db.commit()
+        await db.refresh(cart_item)
         return cart_item
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error updating cart item: {str(e)}")
 
 
 # Remove item from cart
-async def remove_item_from_cart(cart_item_id: int, user_id: int, db: Session):
+async def remove_item_from_cart(cart_item_id: int, user_id: int, db: AsyncSession):
     try:
         # Fetch the cart item with toppings and pizza details
-        cart_item = (
-            db.query(CartItem)
+        result = await db.execute(
+            select(CartItem)
             .options(
                 joinedload(CartItem.cart_toppings).joinedload(CartTopping.topping),
                 joinedload(CartItem.pizza)
             )
             .filter(CartItem.id == cart_item_id)
-            .first()
         )
+        cart_item = result.unique().scalars().first()
 
         if not cart_item:
             raise Exception("Cart item not found.")
 
         # Fetch the associated cart
-        cart = db.query(Cart).filter(Cart.id == cart_item.cart_id, Cart.user_id == user_id).first()
+        result = await db.execute(select(Cart).filter(Cart.id == cart_item.cart_id, Cart.user_id == user_id))
+        cart = result.scalars().first()
         if not cart:
             raise Exception("Cart not found.")
 
+        # Take the line's current price off the cart total, pizza and toppings are already loaded
+        delta = line_cents(
+            cart_item.pizza.price_cents if cart_item.pizza else 0,
+            cart_item.quantity,
+            [
+                (cart_topping.topping.price_cents if cart_topping.topping else 0, cart_topping.quantity)
+                for cart_topping in cart_item.cart_toppings
+            ],
+        )
+
         # Remove the cart item and related toppings
-        db.delete(cart_item)
-        db.commit()
+        await db.delete(cart_item)
+        await db.flush()
 
         # Check if there are remaining items in the cart
-        remaining_items = (
-            db.query(CartItem)
+        result = await db.execute(
+            select(CartItem)
             .filter(CartItem.cart_id == cart.id)
-            .all()
         )
+        remaining_items = result.scalars().all()
 
         if not remaining_items:
-            # If no items remain, delete the cart
-            db.delete(cart)
-            db.commit()
+            # If no items remain, delete the cart; a coupon it held is given back first
+            await release_cart_coupon(cart, db)
+            await db.delete(cart)
+            await db.commit()
             return {"message": "Cart item removed and cart deleted as it was the last item."}
 
         # Update cart total price and discounted price
-        updated_cart = await update_cart_total_price(cart.id, db)
-        return {"message": "Cart item removed successfully.", "updated_cart": updated_cart}
+        await apply_cart_delta(cart.id, -delta, db)
+        await db.commit()
+        await db.refresh(cart)
+        return {"message": "Cart item removed successfully.", "updated_cart": serialize_cart(cart)}
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error removing item from cart: {str(e)}")
 
+# Insert order items and return their ids in cart order
+async def bulk_insert_order_items(order_id: int, cart_items: list, db: AsyncSession):
+    rows = [
+        {"order_id": order_id, "pizza_id": cart_item.pizza_id, "quantity": cart_item.quantity}
+        for cart_item in cart_items
+    ]
+    if db.bind.dialect.name == "postgresql":
+        # The row order of INSERT ... RETURNING is not guaranteed, so the ids are reserved
+        # from the sequence first and inserted explicitly: two statements for any cart size
+        result = await db.execute(
+            select(func.nextval(func.pg_get_serial_sequence(OrderItem.__tablename__, "id")))
+            .select_from(func.generate_series(1, len(rows)))
+        )
+        order_item_ids = result.scalars().all()
+        for row, order_item_id in zip(rows, order_item_ids):
+            row["id"] = order_item_id
+        await db.execute(insert(OrderItem).values(rows))
+        return order_item_ids
+
+    # SQLite, insert row by row inside the same transaction
+    order_item_ids = []
+    for row in rows:
+        result = await db.execute(insert(OrderItem).values(row))
+        order_item_ids.append(result.inserted_primary_key[0])
+    return order_item_ids
+
+
 # Checkout cart and create an order
-async def checkout_cart(cart_id: int, db: Session):
+async def checkout_cart(cart_id: int, db: AsyncSession):
     try:
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
+        result = await db.execute(
+            select(Cart)
+            .options(selectinload(Cart.cart_items).selectinload(CartItem.cart_toppings))
+            .filter(Cart.id == cart_id)
+            .execution_options(populate_existing=True)
+        )
+        cart = result.scalars().first()
         if not cart:
             raise Exception("Cart not found.")
         if not cart.cart_items:
             raise Exception("Cannot checkout an empty cart.")
 
-        final_price = cart.discounted_price if cart.discounted_price else cart.total_price
-        order = Order(user_id=cart.user_id, total_price=final_price)
+        # Everything below runs in a single transaction with one commit
+        # A coupon can bring the price down to zero, so only a cart without one is charged its total
+        final_price_cents = cart.total_price_cents if cart.coupon_id is None else cart.discounted_price_cents
+        order = Order(user_id=cart.user_id, total_price_cents=final_price_cents, status="Received")
         db.add(order)
-        db.commit()
-        db.refresh(order)
-
-        for cart_item in cart.cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                pizza_id=cart_item.pizza_id,
-                quantity=cart_item.quantity
-            )
-            db.add(order_item)
-            db.commit()  # Commit here to save order_item and populate its id
-            db.refresh(order_item)  # Refresh to get the populated id
-
-            for cart_topping in cart_item.cart_toppings:
-                order_topping = OrderTopping(
-                    order_item_id=order_item.id,  # Now it will have a valid id
-                    topping_id=cart_topping.topping_id,
-                    quantity=cart_topping.quantity
-                )
-                db.add(order_topping)
-
-        db.commit()
+        await db.flush()
+
+        cart_items = sorted(cart.cart_items, key=lambda cart_item: cart_item.id)
+        order_item_ids = await bulk_insert_order_items(order.id, cart_items, db)
+
+        order_toppings = [
+            {
+                "order_item_id": order_item_id,
+                "topping_id": cart_topping.topping_id,
+                "quantity": cart_topping.quantity,
+            }
+            for order_item_id, cart_item in zip(order_item_ids, cart_items)
+            for cart_topping in cart_item.cart_toppings
+        ]
+        if order_toppings:
+            await db.execute(insert(OrderTopping).values(order_toppings))
+
+        # Clear the cart with set-based deletes and reset its totals
+        cart_item_ids = select(CartItem.id).filter(CartItem.cart_id == cart_id).scalar_subquery()
+        await db.execute(
+            delete(CartTopping)
+            .filter(CartTopping.cart_item_id.in_(cart_item_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(CartItem)
+            .filter(CartItem.cart_id == cart_id)
+            .execution_options(synchronize_session=False)
+        )
+        # The coupon is consumed by the order; the write only lands if no concurrent removal gave it back
+        if cart.coupon_id is not None:
+            db.add(OrderCoupon(order_id=order.id, coupon_id=cart.coupon_id))
+        coupon_unchanged = Cart.coupon_id.is_(None) if cart.coupon_id is None else Cart.coupon_id == cart.coupon_id
+        result = await db.execute(
+            update(Cart)
+            .filter(Cart.id == cart_id, coupon_unchanged)
+            .values(total_price_cents=0, discounted_price_cents=0, coupon_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            await db.rollback()
+            raise Exception("Cart coupon changed during checkout, please try again.")
 
-        # Clean up the cart items and toppings
-        db.query(CartTopping).filter(CartItem.cart_id == cart_id).delete(synchronize_session='fetch')
-        db.query(CartItem).filter(CartItem.cart_id == cart_id).delete(synchronize_session='fetch')
+        # The confirmation email is queued in the same transaction and sent by the outbox worker
+        await queue_order_confirmation(order.id, db)
 
-        db.commit()
+        await db.commit()
+        notify_email_outbox()
+        await db.refresh(order)
         return order
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error during checkout: {str(e)}")
 
 
 ORDER_STATUSES = ["Received", "Preparing", "Baking", "Ready for Pickup", "Completed"]
 
-def update_order_status(order_id: int, db: Session):
-    try:
-        for status in ORDER_STATUSES:
-            # Pause for 10 seconds between status updates
-            time.sleep(5)  # Explicitly call time.sleep
-            
-            # Update the order status in the database
-            order = db.query(Order).filter(Order.id == order_id).first()
-            if not order:
-                print(f"Order {order_id} not found.")
-                return
-            
-            order.status = status
-            db.commit()
-            
-            # Stop updating if the order is completed
-            if status == "Completed":
-                break
-    except Exception as e:
-        print(f"Error updating order status: {str(e)}")
+NEXT_ORDER_STATUS = dict(zip(ORDER_STATUSES, ORDER_STATUSES[1:]))
+
+# Orders waiting for their next automatic status change, driven by run_order_status_advancer
+order_status_wheel = TimerWheel(tick_seconds=settings.ORDER_STATUS_TICK_SECONDS)
+
+
+ORDER_STATUS_CHANNEL = "order_status"
+
+
+# Tell live subscribers on every worker about a committed status change
+def publish_order_status(order_id: int, status: str, updated_at: datetime = None):
+    event_bus.publish(ORDER_STATUS_CHANNEL, {
+        "order_id": order_id,
+        "status": status,
+        "updated_at": updated_at.isoformat() if updated_at else None,
+    })
+
+
+# Tell live subscribers on every worker that an order was deleted, their streams end
+def publish_order_deleted(order_id: int):
+    event_bus.publish(ORDER_STATUS_CHANNEL, {"order_id": order_id, "status": None, "updated_at": None, "deleted": True})
+
+
+event_bus.subscribe(ORDER_STATUS_CHANNEL, lambda payload: order_events.publish(payload["order_id"], payload))
+
+
+def schedule_order_progress(order_id: int):
+    order_status_wheel.schedule(order_id, settings.ORDER_STATUS_STEP_SECONDS)
+
+
+async def advance_order_statuses(order_ids: Iterable[int], db: AsyncSession) -> List[int]:
+    """
+    Move each order one status forward and return the ids not yet completed.
+
+    Every chunk of orders is advanced by one UPDATE mapping each status to the
+    next, so status changes made meanwhile (e.g. by an admin) are respected.
+    """
+    order_ids = list(order_ids)
+    next_status = case(NEXT_ORDER_STATUS, value=Order.status, else_=Order.status)
+    in_progress = []
+    for start in range(0, len(order_ids), settings.ORDER_STATUS_BATCH_SIZE):
+        chunk = order_ids[start:start + settings.ORDER_STATUS_BATCH_SIZE]
+        await db.execute(
+            update(Order)
+            .filter(Order.id.in_(chunk), Order.status != "Completed")
+            .values(status=next_status)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        result = await db.execute(
+            select(Order.id, Order.status, Order.updated_at).filter(Order.id.in_(chunk))
+        )
+        for order_id, status, updated_at in result.all():
+            publish_order_status(order_id, status, updated_at)
+            if status != "Completed":
+                in_progress.append(order_id)
+    return in_progress
+
+
+# Background loop started with the app; one task advances every order, however many are in flight
+async def run_order_status_advancer():
+    tick_seconds = order_status_wheel.tick_seconds
+    next_tick = time.monotonic() + tick_seconds
+    while True:
+        await asyncio.sleep(max(0, next_tick - time.monotonic()))
+        # Catch up on ticks missed while a slow batch was running
+        due = []
+        while next_tick <= time.monotonic():
+            due.extend(order_status_wheel.advance())
+            next_tick += tick_seconds
+        if not due:
+            continue
+
+        try:
+            async with AsyncSessionLocal() as db:
+                in_progress = await advance_order_statuses(due, db)
+        except Exception as e:
+            print(f"Error updating order status: {str(e)}")
+            # Try again on the next step
+            in_progress = due
+        for order_id in in_progress:
+            schedule_order_progress(order_id)
 
 
 # # Update cart total price
@@ -374,32 +578,28 @@ def update_order_status(order_id: int, db: Session):
 #         raise Exception(f"Error updating cart total price: {str(e)}")
 
 
-# Update cart total price
-async def update_cart_total_price(cart_id: int, db: Session):
+# Recompute one cart's total from scratch (mutations apply deltas instead)
+async def update_cart_total_price(cart_id: int, db: AsyncSession):
     try:
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
+        result = await db.execute(select(Cart).filter(Cart.id == cart_id))
+        cart = result.scalars().first()
         if not cart:
             raise Exception("Cart not found.")
 
-        discounted_amount = cart.total_price - cart.discounted_price
-        total_price = 0
+        discount_cents = 0
+        if cart.coupon_id is not None:
+            result = await db.execute(select(Coupon.discount_cents).filter(Coupon.id == cart.coupon_id))
+            discount_cents = result.scalar() or 0
 
-        # Calculate total price of all items in the cart
-        for cart_item in cart.cart_items:
-            pizza_price = cart_item.pizza.price if cart_item.pizza else 0
-            print(pizza_price)
-            toppings_price = sum(
-                (topping.topping.price if topping.topping else 0) * topping.quantity
-                for topping in cart_item.cart_toppings
-            )
-            total_price += (pizza_price * cart_item.quantity) + toppings_price
+        # Calculate total price of all items in the cart with one aggregate query
+        total_price_cents = await price_cart(cart.id, db)
 
         # Update cart total and discounted prices
-        cart.total_price = total_price
-        cart.discounted_price = max(0, float(total_price) - discounted_amount)  # Ensure non-negative discounted price
-        db.commit()
-        db.refresh(cart)
+        cart.total_price_cents = total_price_cents
+        cart.discounted_price_cents = apply_discount(total_price_cents, discount_cents)
+        await db.commit()
+        await db.refresh(cart)
         return cart
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error updating cart total price: {str(e)}")
@@ -1,22 +1,24 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any, Dict, Optional, List
 from sqlalchemy.exc import SQLAlchemyError
 from db.config import Base
 from .error import CustomError
 
 # Helper function to handle database commits
-def commit(db: Session):
+async def commit(db: AsyncSession):
     try:
-        db.commit()
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise CustomError(f"Database commit failed: {str(e)}")
 
 
 # Reusable function to get a record by ID
-def get_by_id(model: Any, db: Session, record_id: int) -> Optional[Any]:
+async def get_by_id(model: Any, db: AsyncSession, record_id: int) -> Optional[Any]:
     try:
-        record = db.query(model).filter(model.id == record_id).first()
+        result = await db.execute(select(model).filter(model.id == record_id))
+        record = result.scalars().first()
         if not record:
             raise CustomError(f"{model.__name__} not found with ID: {record_id}")
         return record
@@ -25,21 +27,21 @@ def get_by_id(model: Any, db: Session, record_id: int) -> Optional[Any]:
 
 
 # Reusable function to create a new record
-def create(model: Any, db: Session, data: Dict) -> Any:
+async def create(model: Any, db: AsyncSession, data: Dict) -> Any:
     try:
         new_record = model(**data)  # Assuming model is a SQLAlchemy declarative class
         db.add(new_record)
-        commit(db)
+        await commit(db)
         return new_record
     except SQLAlchemyError as e:
         raise CustomError(f"Error creating {model.__name__}: {str(e)}")
 
 
 # Reusable function to update a record
-def update(model: Any, db: Session, record_id: int, data: Dict) -> Any:
+async def update(model: Any, db: AsyncSession, record_id: int, data: Dict) -> Any:
     try:
         # Get the record by its ID
-        record = get_by_id(model, db, record_id)
+        record = await get_by_id(model, db, record_id)
         
         # Only update the fields provided in the data
         for key, value in data.items():
@@ -47,18 +49,18 @@ def update(model: Any, db: Session, record_id: int, data: Dict) -> Any:
                 setattr(record, key, value)
         
         # Commit the changes to the database
-        commit(db)
+        await commit(db)
         return record
     except SQLAlchemyError as e:
         raise CustomError(f"Error updating {model.__name__} with ID {record_id}: {str(e)}")
 
 
 # Reusable function to delete a record
-def delete(model: Any, db: Session, record_id: int) -> bool:
+async def delete(model: Any, db: AsyncSession, record_id: int) -> bool:
     try:
-        record = get_by_id(model, db, record_id)
-        db.delete(record)
-        commit(db)
+        record = await get_by_id(model, db, record_id)
+        await db.delete(record)
+        await commit(db)
         return True
     except SQLAlchemyError as e:
         raise CustomError(f"Error deleting {model.__name__} with ID {record_id}: {str(e)}")
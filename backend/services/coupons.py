@@ -1,86 +1,231 @@
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from models.models import Coupon,CouponUsage,User
+from core.config import settings
+from models.models import Cart, Coupon, CouponUsage, OrderCoupon
 from schemas.coupons import CouponCreate
 from fastapi import HTTPException
-from datetime import datetime
-from sqlalchemy import and_
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from utils.cache import TTLCache
+from utils.event_bus import event_bus
+from services.pricing import from_cents, to_cents
 
-async def create_new_coupon(coupon_data: CouponCreate, db: Session):
+
+# Lightweight coupon record used to validate codes
+@dataclass(frozen=True)
+class CouponRecord:
+    id: int
+    code: str
+    discount_cents: int
+    expiration_date: date
+    usage_limit: Optional[int]
+
+
+# Coupons keyed by code; unknown and expired codes are cached as UNKNOWN_COUPON
+coupon_cache = TTLCache(
+    max_size=settings.COUPON_CACHE_MAX_SIZE,
+    ttl_seconds=settings.COUPON_CACHE_TTL_SECONDS,
+)
+UNKNOWN_COUPON = object()
+
+
+COUPONS_CHANNEL = "coupons"
+
+
+# Every worker caches coupons, so changes are published to all of them
+def invalidate_coupon_code(*codes: str):
+    event_bus.publish(COUPONS_CHANNEL, {"codes": list(codes)})
+
+
+def drop_cached_coupons(payload: dict):
+    for code in payload["codes"]:
+        coupon_cache.invalidate(code)
+
+
+event_bus.subscribe(COUPONS_CHANNEL, drop_cached_coupons)
+event_bus.on_resync(coupon_cache.clear)
+
+
+def seconds_until_expiry(expiration_date: date) -> float:
+    # Coupons are valid through the whole expiration day
+    expires_at = datetime.combine(expiration_date + timedelta(days=1), time.min)
+    return (expires_at - datetime.now()).total_seconds()
+
+
+async def get_coupon_by_code(code: str, db: AsyncSession) -> Optional[CouponRecord]:
+    """Return the valid coupon for a code, or None if it is unknown or expired."""
+    cached = coupon_cache.get(code)
+    if cached is UNKNOWN_COUPON:
+        return None
+    if cached is not None:
+        return cached
+
+    result = await db.execute(select(Coupon).filter(Coupon.code == code))
+    coupon = result.scalars().first()
+    remaining = seconds_until_expiry(coupon.expiration_date) if coupon and coupon.expiration_date else 0
+    if remaining <= 0:
+        coupon_cache.set(code, UNKNOWN_COUPON, settings.COUPON_NEGATIVE_CACHE_TTL_SECONDS)
+        return None
+
+    record = CouponRecord(
+        id=coupon.id,
+        code=coupon.code,
+        discount_cents=coupon.discount_cents,
+        expiration_date=coupon.expiration_date,
+        usage_limit=coupon.usage_limit,
+    )
+    # Entries never outlive the coupon itself
+    coupon_cache.set(code, record, min(settings.COUPON_CACHE_TTL_SECONDS, remaining))
+    return record
+
+# INSERT ... ON CONFLICT builder for the current dialect
+def upsert(model, db: AsyncSession):
+    if db.bind.dialect.name == "postgresql":
+        return postgresql_insert(model)
+    return sqlite_insert(model)
+
+
+async def redeem_coupon(user_id: int, coupon_id: int, db: AsyncSession):
+    """
+    Consume one use of a coupon for a user with conditional writes, so
+    concurrent redemptions cannot over-redeem. The caller commits, or
+    rolls back if this raises.
+    """
+    now = datetime.utcnow()
+
+    # Per-user: insert the usage row as used, or decrement an existing row that still has a use left
+    statement = upsert(CouponUsage, db).values(user_id=user_id, coupon_id=coupon_id, usage_limit=0, used_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CouponUsage.user_id, CouponUsage.coupon_id],
+        set_={"usage_limit": CouponUsage.usage_limit - 1, "used_at": now},
+        where=CouponUsage.usage_limit > 0,
+    )
+    result = await db.execute(statement)
+    if result.rowcount == 0:
+        raise Exception("Coupon already used by this user.")
+
+    # Global: decrement the coupon's remaining uses unless it is unlimited
+    result = await db.execute(
+        update(Coupon)
+        .filter(Coupon.id == coupon_id, or_(Coupon.usage_limit.is_(None), Coupon.usage_limit > 0))
+        .values(usage_limit=Coupon.usage_limit - 1)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        raise Exception("Coupon usage limit reached.")
+
+
+# Coupon for responses, the discount is converted from cents
+def serialize_coupon(coupon: Coupon):
+    return {
+        "id": coupon.id,
+        "code": coupon.code,
+        "discount": from_cents(coupon.discount_cents),
+        "expiration_date": coupon.expiration_date,
+        "usage_limit": coupon.usage_limit,
+        "created_at": coupon.created_at,
+    }
+
+
+async def create_new_coupon(coupon_data: CouponCreate, db: AsyncSession):
     try:
-        # Create the coupon
+        # Create the coupon; every user is entitled to it until they redeem it,
+        # a usage row is only written when a user applies the coupon
         coupon = Coupon(
             code=coupon_data.code,
-            discount=coupon_data.discount,
+            discount_cents=to_cents(coupon_data.discount),
             expiration_date=coupon_data.expiration_date,
+            usage_limit=coupon_data.usage_limit,
         )
         db.add(coupon)
-        db.commit()
-        db.refresh(coupon)
-
-        # Fetch all users from the database
-        users = db.query(User).all()
-
-        # Create coupon usage for all users
-        for user in users:
-            coupon_usage = CouponUsage(user_id=user.id, coupon_id=coupon.id)
-            db.add(coupon_usage)
-
-        db.commit()
+        await db.commit()
+        await db.refresh(coupon)
+        invalidate_coupon_code(coupon.code)
         return coupon
 
     except SQLAlchemyError as e:
-        db.rollback()
-        raise Exception(f"Error creating coupon for all users: {str(e)}")
+        await db.rollback()
+        raise Exception(f"Error creating coupon: {str(e)}")
 
-async def get_all_coupons(db: Session):
-    coupons = db.query(Coupon).all()
+async def get_all_coupons(db: AsyncSession):
+    result = await db.execute(select(Coupon))
+    coupons = result.scalars().all()
     return coupons
 
-async def get_coupon_by_id(coupon_id: int, db: Session):
-    coupon = db.query(Coupon).filter(Coupon.id == coupon_id).first()
+async def get_coupon_by_id(coupon_id: int, db: AsyncSession):
+    result = await db.execute(select(Coupon).filter(Coupon.id == coupon_id))
+    coupon = result.scalars().first()
     if not coupon:
         raise HTTPException(status_code=404, detail="Coupon not found")
     return coupon
 
-async def update_existing_coupon(coupon_id: int, coupon_data: CouponCreate, db: Session):
+async def update_existing_coupon(coupon_id: int, coupon_data: CouponCreate, db: AsyncSession):
     coupon = await get_coupon_by_id(coupon_id, db)
+    previous_code = coupon.code
     coupon.code = coupon_data.code
-    coupon.discount = coupon_data.discount
+    coupon.discount_cents = to_cents(coupon_data.discount)
     coupon.expiration_date = coupon_data.expiration_date
     coupon.usage_limit = coupon_data.usage_limit
-    db.commit()
-    db.refresh(coupon)
+    await db.commit()
+    await db.refresh(coupon)
+    invalidate_coupon_code(previous_code, coupon.code)
     return coupon
 
-async def delete_coupon(coupon_id: int, db: Session):
+async def delete_coupon(coupon_id: int, db: AsyncSession):
     coupon = await get_coupon_by_id(coupon_id, db)
-    coupon_usage = coupon.coupon_usages
-    print(coupon_usage)
-    for usage in coupon_usage:
-        db.delete(usage)
-        db.commit()
-
-    db.delete(coupon)
-    db.commit()
+    try:
+        # Everything referencing the coupon goes in the same transaction, so a failure leaves nothing half deleted.
+        # Open carts holding it are charged their full total again
+        await db.execute(
+            update(Cart)
+            .filter(Cart.coupon_id == coupon_id)
+            .values(coupon_id=None, discounted_price_cents=Cart.total_price_cents)
+            .execution_options(synchronize_session=False)
+        )
+        # Orders keep their coupon row, only the reference to the deleted coupon goes
+        await db.execute(
+            update(OrderCoupon)
+            .filter(OrderCoupon.coupon_id == coupon_id)
+            .values(coupon_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(CouponUsage)
+            .filter(CouponUsage.coupon_id == coupon_id)
+            .execution_options(synchronize_session=False)
+        )
+        await db.delete(coupon)
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise Exception(f"Error deleting coupon: {str(e)}")
+    invalidate_coupon_code(coupon.code)
     return {"id": coupon_id, "deleted": True}
 
 
-async def get_user_active_coupons(user_id: int, db: Session):
+async def get_user_active_coupons(user_id: int, db: AsyncSession):
     # Get current date to check coupon validity
     current_date = datetime.now().date()
 
-    # Query to get active and unused coupons for the user
-    active_coupons = db.query(Coupon).join(CouponUsage).filter(
-        and_(
-            CouponUsage.user_id == user_id,  # Ensure the user has not used this coupon
-            Coupon.expiration_date >= current_date,  # Ensure the coupon is still valid
-            CouponUsage.usage_limit == 1      # Ensure the coupon hasn't been used
+    # Query to get active and unused coupons for the user (no usage row means never used)
+    result = await db.execute(
+        select(Coupon)
+        .outerjoin(CouponUsage, and_(CouponUsage.coupon_id == Coupon.id, CouponUsage.user_id == user_id))
+        .filter(
+            and_(
+                Coupon.expiration_date >= current_date,  # Ensure the coupon is still valid
+                or_(CouponUsage.id.is_(None), CouponUsage.usage_limit == 1)  # Ensure the coupon hasn't been used
+            )
         )
-    ).all()
+    )
+    active_coupons = result.scalars().all()
     # If no active coupons, return an empty list
     if not active_coupons:
         return []
 
     # Return the list of active coupons for the user
-    return [{"coupon_id": coupon.id, "code": coupon.code, "discount": coupon.discount, "expiration_date": coupon.expiration_date} for coupon in active_coupons]
\ No newline at end of file
+    return [{"coupon_id": coupon.id, "code": coupon.code, "discount": from_cents(coupon.discount_cents), "expiration_date": coupon.expiration_date} for coupon in active_coupons]
\ No newline at end of file
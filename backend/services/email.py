@@ -1,102 +1,272 @@
+import asyncio
+import os
 import smtplib
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from email.utils import formataddr
-from sqlalchemy.orm import Session
-from models.models import Order, OrderItem, OrderTopping
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import EmailOutbox, Order, OrderItem, OrderTopping
+from services.pricing import format_cents
+from utils.smtp import smtp_pool
 
-async def send_email(subject: str, body: str, recipient_email: str):
-    try:
-        # SMTP server setup (using Gmail as an example)
-        sender_email = "travelcrafters10@gmail.com"
-        sender_password = "vbrr nssf mvvm kfvg"  # Use app-specific password if using Gmail
-
-        msg = MIMEMultipart()
-        msg['From'] = formataddr(('PIzza Par5adise', sender_email))
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(body, 'html'))
-
-        # Sending the email via Gmail's SMTP server
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()  # Secure connection
-            server.login(sender_email, sender_password)
-            server.sendmail(sender_email, recipient_email, msg.as_string())
-
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        raise
-
-async def generate_order_email(order_data: dict):
-    # Extract order details from the data
-    order = order_data['order']
-    items = order_data['order_items']
-    toppings = order_data['order_toppings']
- 
-    email_body = f"""
-    <h1>Order Confirmation</h1>
-    <p>Thank you for your order!</p>
-    <p><strong>Order ID:</strong> {order.id}</p>
-    <p><strong>Order Date:</strong> {order.created_at}</p>
-    <p><strong>Total Price:</strong> ₹{order.total_price}</p>
-    <p><strong>Status:</strong> {order.status}</p>
-    
-    <h2>Order Items:</h2>
-    <ul>
+# Email templates are compiled once at import; auto_reload is off so renders never touch the filesystem
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+templates = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+)
+templates.filters["rupees"] = format_cents
+
+ORDER_CONFIRMATION_SUBJECT = "Order Confirmation - Your Pizza Order"
+ORDER_CONFIRMATION_TEMPLATE = templates.get_template("email/order_confirmation.html")
+
+# Set when mail is queued in this process, so the outbox worker does not wait for its next poll
+outbox_ready = asyncio.Event()
+
+
+def build_message(subject: str, body: str, recipient_email: str) -> str:
+    msg = MIMEMultipart()
+    msg['From'] = formataddr((settings.EMAIL_SENDER_NAME, settings.EMAIL_SENDER))
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
+
+    msg.attach(MIMEText(body, 'html'))
+    return msg.as_string()
+
+
+def send_messages(messages: List[Tuple[str, str, str]]) -> List[Optional[str]]:
     """
-    for item in items:
-        pizza_name = item.pizza.name  # Accessing the pizza name through the relationship
-        item_price = item.pizza.price  # Accessing the pizza price through the relationship
-        quantity = item.quantity
+    Send (subject, body, recipient) messages over one pooled SMTP connection.
+
+    Runs in a worker thread. Returns None for each message that was sent and
+    the error for each that was not.
+    """
+    results = []
+    connection = None
+    reconnected = False
+    for subject, body, recipient_email in messages:
+        while True:
+            try:
+                if connection is None:
+                    connection = smtp_pool.acquire()
+            except Exception as e:
+                # Server unreachable or login rejected, the rest of the batch fails the same way
+                results.extend([str(e)] * (len(messages) - len(results)))
+                return results
+            try:
+                connection.sendmail(settings.EMAIL_SENDER, recipient_email, build_message(subject, body, recipient_email))
+                results.append(None)
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                # Message rejected, the connection is still usable
+                results.append(str(e))
+            except Exception as e:
+                smtp_pool.discard(connection)
+                connection = None
+                # Pooled connections may have been dropped by the server, retry once on a fresh one
+                if not reconnected:
+                    reconnected = True
+                    continue
+                results.append(str(e))
+            break
+
+    if connection is not None:
+        smtp_pool.release(connection)
+    return results
+
+
+async def send_email(subject: str, body: str, recipient_email: str):
+    # Immediate send off the event loop; order emails go through the outbox instead
+    error, = await asyncio.to_thread(send_messages, [(subject, body, recipient_email)])
+    if error:
+        print(f"Error sending email: {error}")
+        raise Exception(error)
+
 
-        email_body += f"""
-        <li>
-            <strong>{pizza_name}</strong> x {quantity} - ₹{item_price * quantity}
-            <ul>
-        """
+# Queue an email in the caller's transaction, it is sent once the caller commits
+def enqueue_email(subject: str, body: str, recipient_email: str, db: AsyncSession):
+    db.add(EmailOutbox(
+        recipient=recipient_email,
+        subject=subject,
+        body=body,
+        status="Pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    ))
 
-        for topping in toppings:
-            if topping.order_item_id == item.id:
-                topping_name = topping.topping.name  # Accessing the topping name through the relationship
-                topping_price = topping.topping.price
-                email_body += f"""
-                    <li>{topping_name} - ₹{topping_price}</li>
-                """
 
-        email_body += "</ul></li>"
+def notify_email_outbox():
+    outbox_ready.set()
 
-    email_body += "</ul>"
+# Whole order graph in one round trip, toppings arrive grouped under their item
+ORDER_EMAIL_OPTIONS = (
+    joinedload(Order.user),
+    joinedload(Order.order_items).joinedload(OrderItem.pizza),
+    joinedload(Order.order_items).joinedload(OrderItem.order_toppings).joinedload(OrderTopping.topping),
+)
 
-    return email_body
 
+async def load_orders_for_email(order_ids: Iterable[int], db: AsyncSession) -> List[Order]:
+    # populate_existing: an order may have just been flushed in this session, without its server defaults
+    result = await db.execute(
+        select(Order)
+        .options(*ORDER_EMAIL_OPTIONS)
+        .filter(Order.id.in_(list(order_ids)))
+        .order_by(Order.id)
+        .execution_options(populate_existing=True)
+    )
+    return result.unique().scalars().all()
 
 
+def render_order_email(order: Order) -> str:
+    """Confirmation email body for an order loaded with ORDER_EMAIL_OPTIONS."""
+    items = sorted(order.order_items, key=lambda item: item.id)
+    return ORDER_CONFIRMATION_TEMPLATE.render(order=order, items=items)
 
-async def send_order_confirmation_service(order_id: int, db: Session):
-    # Fetch the order and its items
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+
+async def queue_order_confirmation(order_id: int, db: AsyncSession):
+    """Queue the confirmation email for an order as it stands now. The caller commits."""
+    orders = await load_orders_for_email([order_id], db)
+    if not orders:
         raise Exception("Order not found")
+    order = orders[0]
+
+    enqueue_email(ORDER_CONFIRMATION_SUBJECT, render_order_email(order), order.user.email, db)
+
+
+async def send_order_confirmation_service(order_id: int, db: AsyncSession):
+    # Resending only mails the order again, its status belongs to the status advancer
+    await queue_order_confirmation(order_id, db)
+    await db.commit()
+    notify_email_outbox()
+
+    return {"message": "Order confirmation email queued successfully."}
+
+
+# Exponential backoff between delivery attempts
+def retry_delay(attempts: int) -> timedelta:
+    seconds = settings.EMAIL_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1)
+    return timedelta(seconds=min(seconds, settings.EMAIL_RETRY_MAX_SECONDS))
+
+
+async def claim_outbox_batch(db: AsyncSession, limit: int):
+    """
+    Claim due pending messages by pushing their next attempt past the claim window.
+
+    The claim is a conditional update that only lands while the message is still
+    due, so a message another worker claimed first is skipped rather than sent
+    twice. Returned rows already count the attempt being claimed. A worker that
+    dies mid-send leaves its messages to be retried once the claim expires.
+    """
+    now = datetime.utcnow()
+    due = (
+        select(EmailOutbox.id)
+        .filter(EmailOutbox.status == "Pending", EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+    )
+    claim = (
+        update(EmailOutbox)
+        .filter(EmailOutbox.status == "Pending", EmailOutbox.next_attempt_at <= now)
+        .values(
+            attempts=EmailOutbox.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_CLAIM_SECONDS),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    columns = (EmailOutbox.id, EmailOutbox.subject, EmailOutbox.body, EmailOutbox.recipient, EmailOutbox.attempts)
+
+    if db.bind.dialect.name == "postgresql":
+        # One statement, concurrent workers skip rows another one is claiming
+        result = await db.execute(
+            claim.filter(EmailOutbox.id.in_(due.with_for_update(skip_locked=True).scalar_subquery()))
+            .returning(*columns)
+        )
+        messages = sorted(result.all(), key=lambda message: message.id)
+    else:
+        # No UPDATE ... RETURNING here, claim row by row and keep the ones whose update took effect
+        claimed_ids = []
+        for message_id in (await db.execute(due)).scalars().all():
+            result = await db.execute(claim.filter(EmailOutbox.id == message_id))
+            if result.rowcount == 1:
+                claimed_ids.append(message_id)
+        messages = []
+        if claimed_ids:
+            result = await db.execute(select(*columns).filter(EmailOutbox.id.in_(claimed_ids)).order_by(EmailOutbox.id))
+            messages = result.all()
+    await db.commit()
+    return messages
+
+
+async def drain_email_outbox(db: AsyncSession, limit: int = None) -> dict:
+    """Send one batch of due outbox messages across the sender threads and record the outcome."""
+    limit = limit or settings.EMAIL_OUTBOX_BATCH_SIZE
+    messages = await claim_outbox_batch(db, limit)
+    if not messages:
+        return {"claimed": 0, "sent": 0, "failed": 0}
 
-    order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-    order_toppings = db.query(OrderTopping).filter(OrderTopping.order_item_id.in_([item.id for item in order_items])).all()
+    # One chunk per sender thread, each chunk reuses a single SMTP connection
+    chunks = [messages[worker::settings.EMAIL_WORKERS] for worker in range(settings.EMAIL_WORKERS)]
+    chunks = [chunk for chunk in chunks if chunk]
+    results = await asyncio.gather(*[
+        asyncio.to_thread(send_messages, [(message.subject, message.body, message.recipient) for message in chunk])
+        for chunk in chunks
+    ])
 
-    # Generate the email body
-    order_data = {
-        "order": order,
-        "order_items": order_items,
-        "order_toppings": order_toppings
-    }
-    order.status = "Received"
-    db.commit()
-    db.refresh(order)
-    email_body = await generate_order_email(order_data)
+    now = datetime.utcnow()
+    sent_ids = []
+    failed = 0
+    for chunk, errors in zip(chunks, results):
+        for message, error in zip(chunk, errors):
+            if error is None:
+                sent_ids.append(message.id)
+                continue
+            failed += 1
+            print(f"Error sending email {message.id} (attempt {message.attempts}): {error}")
+            values = {"last_error": error, "next_attempt_at": now + retry_delay(message.attempts)}
+            if message.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                values["status"] = "Failed"
+            await db.execute(
+                update(EmailOutbox)
+                .filter(EmailOutbox.id == message.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+    if sent_ids:
+        await db.execute(
+            update(EmailOutbox)
+            .filter(EmailOutbox.id.in_(sent_ids))
+            .values(status="Sent", sent_at=now, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return {"claimed": len(messages), "sent": len(sent_ids), "failed": failed}
 
-    # Send email to the user
-    user_email = order.user.email  # Assuming user's email is stored in the order object
-    await send_email("Order Confirmation - Your Pizza Order", email_body, user_email)
 
+# Background loop started with the app, sends queued email outside of any request
+async def run_email_outbox_worker():
+    while True:
+        outbox_ready.clear()
+        try:
+            async with AsyncSessionLocal() as db:
+                stats = await drain_email_outbox(db)
+            # A full batch means more mail may be waiting
+            if stats["claimed"] == settings.EMAIL_OUTBOX_BATCH_SIZE:
+                continue
+        except Exception as e:
+            print(f"Error draining email outbox: {str(e)}")
 
-    return {"message": "Order confirmation email sent and order status updated successfully."}
\ No newline at end of file
+        try:
+            await asyncio.wait_for(outbox_ready.wait(), timeout=settings.EMAIL_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
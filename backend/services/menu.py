@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.pizza import get_all_pizzas, serialize_pizza
+from services.coupons import get_user_active_coupons
+from services.toppings import get_all_toppings, serialize_topping
+from utils.catalog import menu_catalog
+from utils.http_cache import encode_json, etag_for
+
+
+# Pre-serialized menu responses, rebuilt only after the menu changes
+@dataclass(frozen=True)
+class MenuSnapshot:
+    version: int
+    built_at: datetime
+    pizzas: bytes  # Body of GET /api/pizzas
+    toppings: bytes  # Body of GET /api/toppings/
+    catalog: bytes  # {"pizzas": [...], "toppings": [...]}, the anonymous part of GET /api/menu
+    pizzas_etag: str
+    toppings_etag: str
+    catalog_etag: str
+
+
+async def build_menu_snapshot(version: int, db: AsyncSession) -> MenuSnapshot:
+    pizzas = await get_all_pizzas(db)
+    toppings = await get_all_toppings(db)
+    pizzas_data = [serialize_pizza(pizza) for pizza in pizzas or []]
+    toppings_data = [serialize_topping(topping) for topping in toppings]
+    pizzas_body = encode_json({"Message": "Pizza geted successfully", "data": pizzas_data})
+    toppings_body = encode_json({"Message": "Toppings geted Successfull", "data": toppings_data})
+    catalog_body = encode_json({"pizzas": pizzas_data, "toppings": toppings_data})
+    # ETags hash the content rather than the version, which is only meaningful within this process
+    return MenuSnapshot(
+        version=version,
+        built_at=datetime.utcnow(),
+        pizzas=pizzas_body,
+        toppings=toppings_body,
+        catalog=catalog_body,
+        pizzas_etag=etag_for(pizzas_body),
+        toppings_etag=etag_for(toppings_body),
+        catalog_etag=etag_for(catalog_body),
+    )
+
+
+async def get_menu_snapshot(db: AsyncSession) -> MenuSnapshot:
+    return await menu_catalog.get(lambda version: build_menu_snapshot(version, db))
+
+
+async def get_user_menu(user_id: Optional[int], db: AsyncSession) -> Tuple[bytes, str]:
+    """
+    Body and ETag of GET /api/menu: the cached catalog plus the caller's active coupons.
+
+    Only the coupons are queried and encoded per request, they are spliced into the
+    pre-encoded catalog object.
+    """
+    snapshot = await get_menu_snapshot(db)
+    coupons = await get_user_active_coupons(user_id=user_id, db=db) if user_id is not None else []
+    coupons_body = encode_json(coupons)
+    data = snapshot.catalog[:-1] + b',"coupons":' + coupons_body + b"}"
+    body = b'{"message":"Menu retrieved successfully","data":' + data + b"}"
+    return body, etag_for(snapshot.catalog_etag, coupons_body)
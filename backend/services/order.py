@@ -1,167 +1,258 @@
-from sqlalchemy.orm import Session
+import asyncio
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import SQLAlchemyError
-from models.models import Order, OrderItem, OrderTopping, Cart, CartItem, CouponUsage, Pizza, Topping
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import Order, OrderItem, OrderTopping, Pizza, Topping
 from schemas.order import OrderCreate
+from services.cart import ORDER_STATUSES, checkout_cart, publish_order_deleted, publish_order_status
+from utils.pagination import encode_cursor, decode_cursor, comparable_timestamp
+from utils.pubsub import order_events
+from services.pricing import from_cents
 
-# Create an order based on the cart
-async def create_order(cart_id: int, db: Session):
-    try:
-        cart = db.query(Cart).filter(Cart.id == cart_id).first()
-        if not cart:
-            raise Exception("Cart not found.")
-        
-        order = Order(user_id=cart.user_id, total_price=cart.total_price)
-        db.add(order)
-        db.commit()
-        db.refresh(order)
+# Create an order based on the cart; same single transaction as the cart checkout
+async def create_order(cart_id: int, db: AsyncSession):
+    return await checkout_cart(cart_id, db)
 
-        for cart_item in cart.cart_items:
-            order_item = OrderItem(order_id=order.id, pizza_id=cart_item.pizza_id, quantity=cart_item.quantity)
-            db.add(order_item)
-            db.commit()
+# Eager loading for the order graph, so reading N orders costs a fixed number of queries
+ORDER_GRAPH_OPTIONS = (
+    selectinload(Order.order_items).selectinload(OrderItem.pizza),
+    selectinload(Order.order_items).selectinload(OrderItem.order_toppings).selectinload(OrderTopping.topping),
+)
 
-            for cart_topping in cart_item.cart_toppings:
-                order_topping = OrderTopping(order_item_id=order_item.id, topping_id=cart_topping.topping_id, quantity=cart_topping.quantity)
-                db.add(order_topping)
-                db.commit()
 
-        # Clear the coupon usage
-        coupon_usage = db.query(CouponUsage).filter(CouponUsage.user_id == cart.user_id).first()
-        if coupon_usage:
-            db.delete(coupon_usage)
-            db.commit()
+# Build the order response from an eagerly loaded order
+def serialize_order(order: Order):
+    order_items_data = []
+    for item in sorted(order.order_items, key=lambda order_item: order_item.id):
+        pizza = item.pizza
+        item_price = (pizza.price_cents * item.quantity) if pizza else 0
 
-        return order
+        item_toppings = []
+        total_topping_price = 0
+        for topping in sorted(item.order_toppings, key=lambda order_topping: order_topping.id):
+            topping_details = topping.topping
+            topping_price = (topping_details.price_cents * topping.quantity) if topping_details else 0
+            total_topping_price += topping_price
+            item_toppings.append({
+                "order_item_id": topping.order_item_id,
+                "topping_id": topping.topping_id,
+                "topping_name": topping_details.name if topping_details else None,
+                "quantity": topping.quantity,
+                "price": from_cents(topping_price),
+            })
 
-    except SQLAlchemyError as e:
-        db.rollback()
-        raise Exception(f"Error creating order: {str(e)}")
-    
-async def get_all_orders_for_user(user_id: int, db: Session):
+        order_items_data.append({
+            "id": item.id,
+            "pizza_id": item.pizza_id,
+            "pizza_name": pizza.name if pizza else None,
+            "quantity": item.quantity,
+            "item_price": from_cents(item_price),
+            "toppings": item_toppings,
+            "total_topping_price": from_cents(total_topping_price),
+        })
+
+    return {
+        "order_id": order.id,
+        "total_price": from_cents(order.total_price_cents),
+        "created_at": order.created_at,
+        "status": order.status,
+        "items": order_items_data,
+    }
+
+
+async def get_all_orders_for_user(user_id: int, db: AsyncSession):
     try:
-        orders = db.query(Order).filter(Order.user_id == user_id).all()
+        result = await db.execute(
+            select(Order).options(*ORDER_GRAPH_OPTIONS).filter(Order.user_id == user_id)
+        )
+        orders = result.scalars().all()
         if not orders:
             return {"message": "No orders found for this user."}
 
-        order_data = []
-        for order in orders:
-            order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-            order_toppings = db.query(OrderTopping).filter(OrderTopping.order_item_id.in_([item.id for item in order_items])).all()
-
-            order_items_data = []
-            for item in order_items:
-                pizza = db.query(Pizza).filter(Pizza.id == item.pizza_id).first()
-                item_price = (pizza.price * item.quantity) if pizza else 0
-                
-                item_toppings = []
-                total_topping_price = 0
-                for topping in order_toppings:
-                    if topping.order_item_id == item.id:
-                        topping_details = db.query(Topping).filter(Topping.id == topping.topping_id).first()
-                        topping_price = (topping_details.price * topping.quantity) if topping_details else 0
-                        total_topping_price += topping_price
-                        item_toppings.append({
-                            "order_item_id": topping.order_item_id,
-                            "topping_id": topping.topping_id,
-                            "topping_name": topping_details.name if topping_details else None,
-                            "quantity": topping.quantity,
-                            "price": topping_price,
-                        })
-
-                order_items_data.append({
-                    "id": item.id,
-                    "pizza_id": item.pizza_id,
-                    "pizza_name": pizza.name if pizza else None,
-                    "quantity": item.quantity,
-                    "item_price": item_price,
-                    "toppings": item_toppings,
-                    "total_topping_price": total_topping_price,
-                })
-
-            order_data.append({
-                "order_id": order.id,
-                "total_price": order.total_price,
-                "created_at": order.created_at,
-                "status": order.status,
-                "items": order_items_data,
-            })
-
+        order_data = [serialize_order(order) for order in orders]
         return {"message": "Orders retrieved successfully", "data": order_data}
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return {"message": f"Error retrieving user orders: {str(e)}", "data": []}
     
-async def get_order_by_id(order_id: int, db: Session):
+# Owner of an order, None when the order does not exist
+async def get_order_owner_id(order_id: int, db: AsyncSession):
+    return await db.scalar(select(Order.user_id).filter(Order.id == order_id))
+
+
+# Columns that change when an order does, for conditional GETs without loading the order graph
+async def get_order_version(order_id: int, db: AsyncSession):
+    # The order response shows current pizza and topping names and prices, so their last change counts too
+    pizzas_updated_at = (
+        select(func.max(Pizza.updated_at))
+        .join(OrderItem, OrderItem.pizza_id == Pizza.id)
+        .filter(OrderItem.order_id == order_id)
+        .scalar_subquery()
+    )
+    toppings_updated_at = (
+        select(func.max(Topping.updated_at))
+        .select_from(OrderTopping)
+        .join(OrderItem, OrderItem.id == OrderTopping.order_item_id)
+        .join(Topping, Topping.id == OrderTopping.topping_id)
+        .filter(OrderItem.order_id == order_id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            Order.status,
+            Order.updated_at,
+            Order.total_price_cents,
+            pizzas_updated_at.label("pizzas_updated_at"),
+            toppings_updated_at.label("toppings_updated_at"),
+        ).filter(Order.id == order_id)
+    )
+    return result.first()
+
+
+def order_last_modified(version) -> Optional[datetime]:
+    timestamps = [version.updated_at, version.pizzas_updated_at, version.toppings_updated_at]
+    timestamps = [timestamp for timestamp in timestamps if timestamp is not None]
+    return max(timestamps) if timestamps else None
+
+
+def order_status_event(order_id: int, status: str, updated_at: Optional[datetime]) -> str:
+    data = json.dumps({"order_id": order_id, "status": status, "updated_at": updated_at}, default=export_value)
+    return f"event: status\ndata: {data}\n\n"
+
+
+def order_deleted_event(order_id: int) -> str:
+    return f"event: deleted\ndata: {json.dumps({'order_id': order_id})}\n\n"
+
+
+async def read_order_version(order_id: int):
+    # Short-lived session, the stream itself can stay open for minutes
+    async with AsyncSessionLocal() as db:
+        return await get_order_version(order_id, db)
+
+
+async def stream_order_status(order_id: int):
+    """
+    Server-sent events with an order's status, one per change, until it is Completed.
+
+    The subscription is taken before the current status is read, so a change
+    landing in between is not missed. Between changes the stream only costs
+    an idle connection and a keepalive comment now and then; every
+    ORDER_EVENTS_RECHECK_SECONDS an idle stream re-reads the order in case an
+    event was lost. When the order is deleted, or does not exist, a final
+    `deleted` event is sent and the stream ends.
+    """
+    with order_events.subscribe(order_id) as events:
+        version = await read_order_version(order_id)
+        if not version:
+            yield order_deleted_event(order_id)
+            return
+
+        status = version.status
+        yield order_status_event(order_id, status, version.updated_at)
+        checked_at = time.monotonic()
+        while status != "Completed":
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=settings.ORDER_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if time.monotonic() - checked_at < settings.ORDER_EVENTS_RECHECK_SECONDS:
+                    yield ": keepalive\n\n"
+                    continue
+                version = await read_order_version(order_id)
+                checked_at = time.monotonic()
+                if not version:
+                    event = {"deleted": True}
+                else:
+                    event = {"status": version.status, "updated_at": version.updated_at}
+            if event.get("deleted"):
+                yield order_deleted_event(order_id)
+                return
+            if event["status"] == status:
+                yield ": keepalive\n\n"
+                continue
+            status = event["status"]
+            yield order_status_event(order_id, status, event["updated_at"])
+
+
+async def get_order_by_id(order_id: int, db: AsyncSession):
     try:
-        order = db.query(Order).filter(Order.id == order_id).first()
+        result = await db.execute(
+            select(Order).options(*ORDER_GRAPH_OPTIONS).filter(Order.id == order_id)
+        )
+        order = result.scalars().first()
         if not order:
             raise Exception("Order not found.")
 
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        order_toppings = db.query(OrderTopping).filter(OrderTopping.order_item_id.in_([item.id for item in order_items])).all()
-
-        order_items_data = []
-        for item in order_items:
-            pizza = db.query(Pizza).filter(Pizza.id == item.pizza_id).first()
-            item_price = (pizza.price * item.quantity) if pizza else 0
-
-            item_toppings = []
-            total_topping_price = 0
-            for topping in order_toppings:
-                if topping.order_item_id == item.id:
-                    topping_details = db.query(Topping).filter(Topping.id == topping.topping_id).first()
-                    topping_price = (topping_details.price * topping.quantity) if topping_details else 0
-                    total_topping_price += topping_price
-                    item_toppings.append({
-                        "order_item_id": topping.order_item_id,
-                        "topping_id": topping.topping_id,
-                        "topping_name": topping_details.name if topping_details else None,
-                        "quantity": topping.quantity,
-                        "price": topping_price,
-                    })
-
-            order_items_data.append({
-                "id": item.id,
-                "pizza_id": item.pizza_id,
-                "pizza_name": pizza.name if pizza else None,
-                "quantity": item.quantity,
-                "item_price": item_price,
-                "toppings": item_toppings,
-                "total_topping_price": total_topping_price,
-            })
-
-        return {
-            "order_id": order.id,
-            "total_price": order.total_price,
-            "created_at": order.created_at,
-            "status": order.status,
-            "items": order_items_data,
-        }
+        return serialize_order(order)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise Exception(f"Error retrieving order by ID: {str(e)}")
 
 
 
-async def get_all_orders(db: Session):
+async def get_all_orders(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = settings.ORDERS_PAGE_SIZE,
+    status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    # Keyset pagination over (created_at, id), newest orders first
+    if status and status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid order status.")
+    after = decode_cursor(cursor)
+    limit = max(1, min(limit, settings.ORDERS_MAX_PAGE_SIZE))
+
+    created_at, to_created_at = comparable_timestamp(Order.created_at, db.bind.dialect.name)
+
     try:
-        orders = db.query(Order).all()
+        query = select(Order).options(selectinload(Order.order_items).selectinload(OrderItem.order_toppings))
+        if status:
+            query = query.filter(Order.status == status)
+        if created_from:
+            query = query.filter(created_at >= to_created_at(created_from))
+        if created_to:
+            query = query.filter(created_at < to_created_at(created_to))
+        if after:
+            after_created_at, after_id = after
+            query = query.filter(
+                or_(
+                    created_at < to_created_at(after_created_at),
+                    and_(created_at == to_created_at(after_created_at), Order.id < after_id),
+                )
+            )
+
+        # Fetch one extra row to know whether another page exists
+        result = await db.execute(query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1))
+        orders = result.scalars().all()
 
         if not orders:
-            return {"message": "No orders found.", "data": []}
+            return {"message": "No orders found.", "data": [], "next_cursor": None}
+
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id)
 
         order_data = []
         for order in orders:
-            # Fetching order items for the current order
-            order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-            order_toppings = db.query(OrderTopping).filter(OrderTopping.order_item_id.in_([item.id for item in order_items])).all()
-
+            order_items = order.order_items
             order_data.append({
                 "order": {
                     "id": order.id,
                     "user_id": order.user_id,
-                    "total_price": order.total_price,
+                    "total_price": from_cents(order.total_price_cents),
                     "created_at": order.created_at,
                     "status": order.status,
                 },
@@ -177,37 +268,39 @@ async def get_all_orders(db: Session):
                         "order_item_id": topping.order_item_id,
                         "topping_id": topping.topping_id,
                         "quantity": topping.quantity
-                    } for topping in order_toppings
+                    } for item in order_items for topping in item.order_toppings
                 ]
             })
         
-        return {"message": "Orders retrieved successfully", "data": order_data}
+        return {"message": "Orders retrieved successfully", "data": order_data, "next_cursor": next_cursor}
 
     except SQLAlchemyError as e:
-        db.rollback()
-        return {"message": f"Error retrieving orders: {str(e)}", "data": []}
+        await db.rollback()
+        return {"message": f"Error retrieving orders: {str(e)}", "data": [], "next_cursor": None}
     
 
 
     # Delete Order for Admin
-async def delete_order_for_admin(order_id: int, db: Session):
+async def delete_order_for_admin(order_id: int, db: AsyncSession):
     try:
-        order = db.query(Order).filter(Order.id == order_id).first()
+        result = await db.execute(select(Order).filter(Order.id == order_id))
+        order = result.scalars().first()
         if not order:
             raise Exception("Order not found.")
         
-        db.delete(order)
-        db.commit()
+        await db.delete(order)
+        await db.commit()
+        publish_order_deleted(order_id)
         return {"message": "Order deleted successfully.", "data": {}}
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         return {"message": f"Error deleting order: {str(e)}", "data": {}}
     
 
 
 # Update Order Status (Admin only)
-async def update_order_status_for_admin(order_id: int, new_status: str, db: Session):
+async def update_order_status_for_admin(order_id: int, new_status: str, db: AsyncSession):
     try:
         # Define the valid statuses
         valid_statuses = ['Received', 'Preparing', 'Baking', 'Ready for Pickup', 'Completed']
@@ -217,17 +310,110 @@ async def update_order_status_for_admin(order_id: int, new_status: str, db: Sess
             raise Exception("Invalid order status.")
         
         # Fetch the order
-        order = db.query(Order).filter(Order.id == order_id).first()
+        result = await db.execute(select(Order).filter(Order.id == order_id))
+        order = result.scalars().first()
         if not order:
             raise Exception("Order not found.")
         
         # Update the order status
         order.status = new_status
-        db.commit()
-        db.refresh(order)
+        await db.commit()
+        await db.refresh(order)
+        publish_order_status(order.id, order.status, order.updated_at)
         
         return {"message": "Order status updated successfully", "data": {"order_id": order.id, "status": order.status}}
     
     except SQLAlchemyError as e:
-        db.rollback()
-        return {"message": f"Error updating order status: {str(e)}", "data": {}}
\ No newline at end of file
+        await db.rollback()
+        return {"message": f"Error updating order status: {str(e)}", "data": {}}
+
+EXPORT_CSV_COLUMNS = [
+    "order_id", "user_id", "status", "total_price", "created_at",
+    "order_item_id", "pizza_id", "quantity", "topping_id", "topping_quantity",
+]
+
+
+# Timestamps as ISO 8601 and money as exact decimal strings
+def export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+# Export row with the order total converted from cents
+def export_row(row):
+    row = list(row)
+    row[3] = from_cents(row[3])
+    return row
+
+
+# Stream orders with their items and toppings as NDJSON or CSV chunks
+async def stream_orders_export(
+    export_format: str = "ndjson",
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    # The response outlives the request dependencies, so the export uses its own session
+    async with AsyncSessionLocal() as db:
+        created_at, to_created_at = comparable_timestamp(Order.created_at, db.bind.dialect.name)
+        query = (
+            select(
+                Order.id, Order.user_id, Order.status, Order.total_price_cents, Order.created_at,
+                OrderItem.id, OrderItem.pizza_id, OrderItem.quantity,
+                OrderTopping.topping_id, OrderTopping.quantity,
+            )
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(OrderTopping, OrderTopping.order_item_id == OrderItem.id)
+            .order_by(Order.id, OrderItem.id, OrderTopping.id)
+        )
+        if created_from:
+            query = query.filter(created_at >= to_created_at(created_from))
+        if created_to:
+            query = query.filter(created_at < to_created_at(created_to))
+
+        # Server-side cursor, rows arrive in batches instead of being materialised
+        result = await db.stream(query.execution_options(yield_per=settings.ORDER_EXPORT_BATCH_SIZE))
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_CSV_COLUMNS)
+            async for rows in result.partitions():
+                writer.writerows(
+                    [export_value(value) if value is not None else None for value in export_row(row)]
+                    for row in rows
+                )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+            return
+
+        # NDJSON: one line per order, rows for the same order are consecutive
+        current = None
+        current_item = None
+        async for rows in result.partitions():
+            lines = []
+            for (order_id, user_id, order_status, total_price_cents, order_created_at,
+                 order_item_id, pizza_id, quantity, topping_id, topping_quantity) in rows:
+                if current is None or current["order_id"] != order_id:
+                    if current is not None:
+                        lines.append(json.dumps(current, default=export_value))
+                    current = {
+                        "order_id": order_id,
+                        "user_id": user_id,
+                        "status": order_status,
+                        "total_price": from_cents(total_price_cents),
+                        "created_at": order_created_at,
+                        "items": [],
+                    }
+                    current_item = None
+                if order_item_id is None:
+                    continue
+                if current_item is None or current_item["id"] != order_item_id:
+                    current_item = {"id": order_item_id, "pizza_id": pizza_id, "quantity": quantity, "toppings": []}
+                    current["items"].append(current_item)
+                if topping_id is not None:
+                    current_item["toppings"].append({"topping_id": topping_id, "quantity": topping_quantity})
+            if lines:
+                yield "\n".join(lines) + "\n"
+        if current is not None:
+            yield json.dumps(current, default=export_value) + "\n"
@@ -1,20 +1,40 @@
 import os
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import Pizza
 from schemas.pizza import PizzaCreateUpdate,PizzaResponse
 from fastapi import HTTPException
 from fastapi import HTTPException, UploadFile,File
 from utils.dependencies import get_upload_path, admin_required
+from services.pricing import from_cents, to_cents
+from utils.catalog import invalidate_menu
+from utils.uploads import save_upload
+from utils.images import generate_variants
+from core.config import settings
 
-async def get_all_pizzas(db: Session):
-    pizzas = db.query(Pizza).all()
+# Pizza for responses, the price is converted from cents
+def serialize_pizza(pizza: Pizza):
+    return {
+        "id": pizza.id,
+        "name": pizza.name,
+        "description": pizza.description,
+        "image": pizza.image,
+        "image_variants": pizza.image_variants,
+        "price": from_cents(pizza.price_cents),
+        "created_at": pizza.created_at,
+    }
+
+async def get_all_pizzas(db: AsyncSession):
+    result = await db.execute(select(Pizza))
+    pizzas = result.scalars().all()
     if not pizzas:
         {"Message" : "Pizza Not Found","data":[]}
     else:
         return pizzas 
 
-async def get_pizza_by_id(pizza_id: int, db: Session):
-    pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+async def get_pizza_by_id(pizza_id: int, db: AsyncSession):
+    result = await db.execute(select(Pizza).filter(Pizza.id == pizza_id))
+    pizza = result.scalars().first()
     if not pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
     return pizza
@@ -30,56 +50,98 @@ async def save_image(file, pizza_name: str):
         filename = f"{pizza_name.lower().replace(' ', '_')}.{file_extension}"
         file_path = os.path.join(upload_dir, filename)
 
-        # Save the image to the server
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
+        # Stream the image to the server without blocking the event loop
+        size, seconds = await save_upload(
+            file.file,
+            file_path,
+            max_bytes=settings.IMAGE_UPLOAD_MAX_BYTES,
+            chunk_bytes=settings.IMAGE_UPLOAD_CHUNK_BYTES,
+        )
+        throughput = size / seconds / (1024 * 1024) if seconds else 0
+        print(f"Saved image {filename}: {size} bytes in {seconds:.3f}s ({throughput:.1f} MB/s)")
         
         # Generate image URL (assuming static URL)
         image_url = f"/static/images/{filename}"
         return image_url
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
 
-async def create_pizza(name: str, description: str, price: float, file: UploadFile, db: Session):
+# Resized and WebP copies of an uploaded image. An original that cannot be read or decoded
+# gets {} so it is not retried, None means the attempt failed and can be made again
+async def build_image_variants(image_url: str):
+    if not image_url:
+        return None
+    upload_dir = get_upload_path()
+    source_path = os.path.join(upload_dir, os.path.basename(image_url))
+    try:
+        variants = await generate_variants(source_path, os.path.join(upload_dir, "derived"))
+    except OSError as e:
+        print(f"Cannot generate image variants for {image_url}: {str(e)}")
+        return {}
+    except Exception as e:
+        print(f"Error generating image variants for {image_url}: {str(e)}")
+        return None
+    return {name: f"/static/images/derived/{filename}" for name, filename in variants.items()}
+
+async def create_pizza(name: str, description: str, price: float, file: UploadFile, db: AsyncSession):
     # Check if pizza with the same name already exists
-    existing_pizza = db.query(Pizza).filter(Pizza.name == name).first()
+    result = await db.execute(select(Pizza).filter(Pizza.name == name))
+    existing_pizza = result.scalars().first()
     if existing_pizza:
         raise HTTPException(status_code=400, detail="Pizza with this name already exists")
     
     # Save image and get the URL
     image_url = await save_image(file, name)
+    image_variants = await build_image_variants(image_url)
 
     # Create new pizza object and save it to the database
     new_pizza = Pizza(
         name=name,
         description=description,
-        price=price,
+        price_cents=to_cents(price),
         image=image_url,  # Save image URL to the database
+        image_variants=image_variants,
     )
     
     db.add(new_pizza)
-    db.commit()
-    db.refresh(new_pizza)
+    await db.commit()
+    invalidate_menu()
+    await db.refresh(new_pizza)
     
     return new_pizza
 
-async def update_pizza(pizza_id: int, pizza_data: PizzaCreateUpdate, db: Session):
-    pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+async def update_pizza(pizza_id: int, pizza_data: PizzaCreateUpdate, db: AsyncSession):
+    result = await db.execute(select(Pizza).filter(Pizza.id == pizza_id))
+    pizza = result.scalars().first()
     if not pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
 
-    for key, value in pizza_data.dict().items():
+    # Partial update: fields left out, or sent as null, keep their value (a missing price is not free)
+    for key, value in pizza_data.dict(exclude_unset=True).items():
+        if value is None:
+            continue
+        if key == "price":
+            key, value = "price_cents", to_cents(value)
         setattr(pizza, key, value)
 
-    db.commit()
-    db.refresh(pizza)
+    # Backfill variants for pizzas created before the image pipeline existed
+    if pizza.image and pizza.image_variants is None:
+        pizza.image_variants = await build_image_variants(pizza.image)
+
+    await db.commit()
+    invalidate_menu()
+    await db.refresh(pizza)
     return pizza
 
-async def delete_pizza(pizza_id: int, db: Session):
-    pizza = db.query(Pizza).filter(Pizza.id == pizza_id).first()
+async def delete_pizza(pizza_id: int, db: AsyncSession):
+    result = await db.execute(select(Pizza).filter(Pizza.id == pizza_id))
+    pizza = result.scalars().first()
     if not pizza:
         raise HTTPException(status_code=404, detail="Pizza not found")
 
-    db.delete(pizza)
-    db.commit()
+    await db.delete(pizza)
+    await db.commit()
+    invalidate_menu()
     return {"message": "Pizza deleted successfully"}
@@ -0,0 +1,295 @@
+import asyncio
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from sqlalchemy import case, func, or_, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import Cart, CartItem, CartTopping, Coupon, Pizza, Topping
+
+# All money is integer cents internally; rupee amounts only exist at the API and email edges
+
+
+def to_cents(amount: Union[int, float, str, Decimal, None]) -> Optional[int]:
+    """Convert a rupee amount from a request to integer cents, rounding half up."""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: Optional[int]) -> Optional[Decimal]:
+    """Rupee amount for responses, e.g. 1050 -> Decimal('10.50')."""
+    if cents is None:
+        return None
+    return Decimal(cents).scaleb(-2)
+
+
+def format_cents(cents: Optional[int]) -> str:
+    return str(from_cents(cents or 0))
+
+
+# Flat coupon discount, a cart never goes below zero
+def apply_discount(total_cents: int, discount_cents: int) -> int:
+    return max(0, total_cents - discount_cents)
+
+
+# Aggregate query pricing carts straight from cart_items/cart_toppings, without loading ORM objects
+def cart_totals_query(cart_ids: Iterable[int]):
+    cart_ids = list(cart_ids)
+    pizza_amounts = (
+        select(CartItem.cart_id.label("cart_id"), func.sum(Pizza.price_cents * CartItem.quantity).label("amount"))
+        .join(Pizza, Pizza.id == CartItem.pizza_id)
+        .filter(CartItem.cart_id.in_(cart_ids))
+        .group_by(CartItem.cart_id)
+    )
+    # Toppings are charged per topping quantity, not per pizza quantity
+    topping_amounts = (
+        select(CartItem.cart_id.label("cart_id"), func.sum(Topping.price_cents * CartTopping.quantity).label("amount"))
+        .select_from(CartTopping)
+        .join(CartItem, CartItem.id == CartTopping.cart_item_id)
+        .join(Topping, Topping.id == CartTopping.topping_id)
+        .filter(CartItem.cart_id.in_(cart_ids))
+        .group_by(CartItem.cart_id)
+    )
+    amounts = union_all(pizza_amounts, topping_amounts).subquery()
+    return select(amounts.c.cart_id, func.sum(amounts.c.amount)).group_by(amounts.c.cart_id)
+
+
+async def price_carts(cart_ids: Iterable[int], db: AsyncSession) -> Dict[int, int]:
+    """Return the total price in cents for each cart id in one query (empty carts price at 0)."""
+    cart_ids = list(cart_ids)
+    totals = {cart_id: 0 for cart_id in cart_ids}
+    if not cart_ids:
+        return totals
+
+    result = await db.execute(cart_totals_query(cart_ids))
+    for cart_id, amount in result.all():
+        totals[cart_id] = int(amount or 0)
+    return totals
+
+
+async def price_cart(cart_id: int, db: AsyncSession) -> int:
+    totals = await price_carts([cart_id], db)
+    return totals[cart_id]
+
+
+# Correlated total of the enclosing cart, for set-based UPDATEs of the carts table
+def cart_total_expression():
+    pizza_total = (
+        select(func.coalesce(func.sum(Pizza.price_cents * CartItem.quantity), 0))
+        .select_from(CartItem)
+        .join(Pizza, Pizza.id == CartItem.pizza_id)
+        .filter(CartItem.cart_id == Cart.id)
+        .scalar_subquery()
+    )
+    topping_total = (
+        select(func.coalesce(func.sum(Topping.price_cents * CartTopping.quantity), 0))
+        .select_from(CartTopping)
+        .join(CartItem, CartItem.id == CartTopping.cart_item_id)
+        .join(Topping, Topping.id == CartTopping.topping_id)
+        .filter(CartItem.cart_id == Cart.id)
+        .scalar_subquery()
+    )
+    return pizza_total + topping_total
+
+
+# Discounted price of the enclosing cart for a new total, from the discount of the coupon it holds.
+# The stored discounted price is clamped at zero, so the discount is never derived from it
+def cart_discounted_expression(total_price_cents):
+    discount_cents = func.coalesce(
+        select(Coupon.discount_cents).filter(Coupon.id == Cart.coupon_id).scalar_subquery(), 0
+    )
+    discounted_price_cents = total_price_cents - discount_cents
+    return case((discounted_price_cents < 0, 0), else_=discounted_price_cents)
+
+
+# Price of one cart line in cents: pizza price times quantity plus each topping price times its own quantity
+def line_cents(pizza_price_cents: Optional[int], quantity: int, toppings: Iterable[Tuple[Optional[int], int]]) -> int:
+    amount = (pizza_price_cents or 0) * quantity
+    for topping_price_cents, topping_quantity in toppings:
+        amount += (topping_price_cents or 0) * topping_quantity
+    return amount
+
+
+async def cart_line_amount(
+    pizza_id: int, quantity: int, toppings: Iterable[Tuple[int, int]], db: AsyncSession
+) -> int:
+    toppings = list(toppings)
+    result = await db.execute(select(Pizza.price_cents).filter(Pizza.id == pizza_id))
+    pizza_price_cents = result.scalars().first()
+
+    topping_prices = {}
+    if toppings:
+        result = await db.execute(
+            select(Topping.id, Topping.price_cents).filter(Topping.id.in_([topping_id for topping_id, _ in toppings]))
+        )
+        topping_prices = dict(result.all())
+    return line_cents(
+        pizza_price_cents,
+        quantity,
+        [(topping_prices.get(topping_id), topping_quantity) for topping_id, topping_quantity in toppings],
+    )
+
+
+async def apply_cart_delta(cart_id: int, delta: int, db: AsyncSession) -> None:
+    """
+    Shift a cart's total by `delta` cents inside the caller's transaction and
+    derive its discounted price from the new total.
+
+    The change is applied in SQL so concurrent mutations of the same cart add up
+    instead of overwriting each other. The caller commits.
+    """
+    if not delta:
+        return
+    total_price_cents = func.coalesce(Cart.total_price_cents, 0) + delta
+    await db.execute(
+        update(Cart)
+        .filter(Cart.id == cart_id)
+        .values(
+            total_price_cents=total_price_cents,
+            discounted_price_cents=cart_discounted_expression(total_price_cents),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_cart_totals(db: AsyncSession, batch_size: int = None) -> dict:
+    """
+    Recompute every cart total from its items and repair the ones that drifted.
+
+    Carts are walked in id order, one batch per transaction. A repair takes the
+    discount of the cart's coupon off the new total and only lands if the stored
+    total has not changed since it was read.
+    """
+    batch_size = batch_size or settings.CART_RECONCILE_BATCH_SIZE
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(Cart.id, Cart.total_price_cents, Coupon.discount_cents)
+            .outerjoin(Coupon, Coupon.id == Cart.coupon_id)
+            .filter(Cart.id > last_id)
+            .order_by(Cart.id)
+            .limit(batch_size)
+        )
+        carts = result.all()
+        if not carts:
+            break
+        last_id = carts[-1].id
+
+        totals = await price_carts([cart.id for cart in carts], db)
+        for cart in carts:
+            stored_total = cart.total_price_cents or 0
+            expected_total = totals[cart.id]
+            if stored_total == expected_total:
+                continue
+            unchanged = (
+                Cart.total_price_cents.is_(None)
+                if cart.total_price_cents is None
+                else Cart.total_price_cents == cart.total_price_cents
+            )
+            result = await db.execute(
+                update(Cart)
+                .filter(Cart.id == cart.id, unchanged)
+                .values(
+                    total_price_cents=expected_total,
+                    discounted_price_cents=apply_discount(expected_total, cart.discount_cents or 0),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            repaired += result.rowcount
+        await db.commit()
+        checked += len(carts)
+
+    return {"checked": checked, "repaired": repaired}
+
+
+async def reprice_carts(
+    db: AsyncSession,
+    pizza_ids: Iterable[int] = (),
+    topping_ids: Iterable[int] = (),
+    batch_size: int = None,
+) -> dict:
+    """
+    Recompute the totals of every cart holding one of the given pizzas or toppings.
+
+    Affected carts are found in id order and each chunk is repriced by a single
+    UPDATE computing the new totals in SQL, so no cart rows are loaded. The
+    discount of each cart's coupon is taken off the new total.
+    """
+    batch_size = batch_size or settings.CART_REPRICE_BATCH_SIZE
+    pizza_ids, topping_ids = list(pizza_ids), list(topping_ids)
+    started = time.perf_counter()
+
+    affected = []
+    if pizza_ids:
+        affected.append(CartItem.pizza_id.in_(pizza_ids))
+    if topping_ids:
+        affected.append(
+            CartItem.id.in_(select(CartTopping.cart_item_id).filter(CartTopping.topping_id.in_(topping_ids)))
+        )
+    if not affected:
+        return {"carts": 0, "seconds": 0.0, "carts_per_second": 0}
+
+    total_price_cents = cart_total_expression()
+
+    carts = 0
+    last_id = 0
+    while True:
+        result = await db.execute(
+            select(CartItem.cart_id)
+            .filter(CartItem.cart_id > last_id, or_(*affected))
+            .distinct()
+            .order_by(CartItem.cart_id)
+            .limit(batch_size)
+        )
+        cart_ids = result.scalars().all()
+        if not cart_ids:
+            break
+        last_id = cart_ids[-1]
+
+        await db.execute(
+            update(Cart)
+            .filter(Cart.id.in_(cart_ids))
+            .values(
+                total_price_cents=total_price_cents,
+                discounted_price_cents=cart_discounted_expression(total_price_cents),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        carts += len(cart_ids)
+
+    seconds = time.perf_counter() - started
+    return {
+        "carts": carts,
+        "seconds": round(seconds, 3),
+        "carts_per_second": round(carts / seconds) if seconds else carts,
+    }
+
+
+# Background job run after an admin changes a pizza or topping price
+async def run_cart_repricing(pizza_ids: Iterable[int] = (), topping_ids: Iterable[int] = ()):
+    try:
+        async with AsyncSessionLocal() as db:
+            stats = await reprice_carts(db, pizza_ids=pizza_ids, topping_ids=topping_ids)
+        print(f"Repriced {stats['carts']} carts in {stats['seconds']}s ({stats['carts_per_second']} carts/s)")
+        return stats
+    except Exception as e:
+        print(f"Error repricing carts: {str(e)}")
+
+
+# Background loop started with the app when CART_RECONCILE_INTERVAL_SECONDS is set
+async def run_cart_reconciler(interval_seconds: float):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            async with AsyncSessionLocal() as db:
+                stats = await reconcile_cart_totals(db)
+            if stats["repaired"]:
+                print(f"Cart reconciliation repaired {stats['repaired']} of {stats['checked']} carts")
+        except Exception as e:
+            print(f"Error reconciling cart totals: {str(e)}")
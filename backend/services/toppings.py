@@ -1,44 +1,64 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import Topping
 from schemas.toppings import ToppingCreate
 from fastapi import HTTPException
+from services.pricing import from_cents, to_cents
+from utils.catalog import invalidate_menu
 
-async def create_new_topping(topping: ToppingCreate, db: Session):
-    existing_topping = db.query(Topping).filter(Topping.name == topping.name).first()
+# Topping for responses, the price is converted from cents
+def serialize_topping(topping: Topping):
+    return {
+        "id": topping.id,
+        "name": topping.name,
+        "price": from_cents(topping.price_cents),
+        "created_at": topping.created_at,
+    }
+
+async def create_new_topping(topping: ToppingCreate, db: AsyncSession):
+    result = await db.execute(select(Topping).filter(Topping.name == topping.name))
+    existing_topping = result.scalars().first()
     if existing_topping:
         raise HTTPException(status_code=400, detail="Topping already exists")
 
-    new_topping = Topping(name=topping.name, price=topping.price)
+    new_topping = Topping(name=topping.name, price_cents=to_cents(topping.price))
     db.add(new_topping)
-    db.commit()
-    db.refresh(new_topping)
+    await db.commit()
+    invalidate_menu()
+    await db.refresh(new_topping)
     return new_topping
 
-async def get_all_toppings(db: Session):
-    return db.query(Topping).all()
+async def get_all_toppings(db: AsyncSession):
+    result = await db.execute(select(Topping))
+    return result.scalars().all()
 
-async def get_topping_by_id(topping_id: int, db: Session):
-    topping = db.query(Topping).filter(Topping.id == topping_id).first()
+async def get_topping_by_id(topping_id: int, db: AsyncSession):
+    result = await db.execute(select(Topping).filter(Topping.id == topping_id))
+    topping = result.scalars().first()
     if not topping:
         raise HTTPException(status_code=404, detail="Topping not found")
     return topping
 
-async def update_existing_topping(topping_id: int, topping: ToppingCreate, db: Session):
-    existing_topping = db.query(Topping).filter(Topping.id == topping_id).first()
+async def update_existing_topping(topping_id: int, topping: ToppingCreate, db: AsyncSession):
+    result = await db.execute(select(Topping).filter(Topping.id == topping_id))
+    existing_topping = result.scalars().first()
     if not existing_topping:
         raise HTTPException(status_code=404, detail="Topping not found")
 
     existing_topping.name = topping.name
-    existing_topping.price = topping.price
-    db.commit()
-    db.refresh(existing_topping)
+    existing_topping.price_cents = to_cents(topping.price)
+    await db.commit()
+    invalidate_menu()
+    await db.refresh(existing_topping)
     return existing_topping
 
-async def delete_topping(topping_id: int, db: Session):
-    topping = db.query(Topping).filter(Topping.id == topping_id).first()
+async def delete_topping(topping_id: int, db: AsyncSession):
+    result = await db.execute(select(Topping).filter(Topping.id == topping_id))
+    topping = result.scalars().first()
     if not topping:
         raise HTTPException(status_code=404, detail="Topping not found")
 
-    db.delete(topping)
-    db.commit()
+    await db.delete(topping)
+    await db.commit()
+    invalidate_menu()
     return {"message": "Topping deleted successfully"}
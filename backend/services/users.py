@@ -1,13 +1,16 @@
 # app/services/admin.py
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import User, Order
 from sqlalchemy.exc import SQLAlchemyError
 from services.auth import register_user
+from utils.jwt import invalidate_principal
+from services.pricing import from_cents
 
 
 
-async def create_admin_service(admin_data, db: Session):
+async def create_admin_service(admin_data, db: AsyncSession):
     try:
         # Register a new user using the existing register_user function
         new_admin = await register_user(admin_data, db)
@@ -16,26 +19,29 @@ async def create_admin_service(admin_data, db: Session):
         new_admin.role = "admin"
         
         # Commit the changes to the database
-        db.commit()
-        db.refresh(new_admin)
+        await db.commit()
+        await db.refresh(new_admin)
+        invalidate_principal(new_admin.email)
         
         return new_admin  # Return the updated admin object
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating admin: {str(e)}")
     
 # Get all users from the database
-async def get_all_users(db: Session):
+async def get_all_users(db: AsyncSession):
     try:
         # Fetch all users and return them as dictionaries
-        users = db.query(User).all()
+        result = await db.execute(select(User))
+        users = result.scalars().all()
         return [{"id": user.id, "username": user.name, "email": user.email,"role":user.role} for user in users]
     except SQLAlchemyError as e:
         raise Exception(f"Error fetching users: {str(e)}")
 
 # Get details of a specific user by user_id
-async def get_user_details(user_id: int, db: Session):
+async def get_user_details(user_id: int, db: AsyncSession):
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        result = await db.execute(select(User).filter(User.id == user_id))
+        user = result.scalars().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         # Return the user details as a dictionary
@@ -44,10 +50,11 @@ async def get_user_details(user_id: int, db: Session):
         raise Exception(f"Error fetching user details: {str(e)}")
 
 # Get all orders of a specific user
-async def get_user_orders(user_id: int, db: Session):
+async def get_user_orders(user_id: int, db: AsyncSession):
     try:
-        orders = db.query(Order).filter(Order.user_id == user_id).all()
+        result = await db.execute(select(Order).filter(Order.user_id == user_id))
+        orders = result.scalars().all()
         # Return a list of orders as dictionaries
-        return [{"id": order.id, "total_price": order.total_price, "status": order.status, "created_at": order.created_at} for order in orders]
+        return [{"id": order.id, "total_price": from_cents(order.total_price_cents), "status": order.status, "created_at": order.created_at} for order in orders]
     except SQLAlchemyError as e:
         raise Exception(f"Error fetching user orders: {str(e)}")
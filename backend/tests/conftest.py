@@ -0,0 +1,87 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Tests run against a throwaway SQLite database; must be set before db.config is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+
+from db.config import Base, SessionLocal, async_engine, engine  # noqa: E402
+import models.models  # noqa: E402,F401
+from services.coupons import coupon_cache  # noqa: E402
+from utils.jwt import create_access_token, principal_cache  # noqa: E402
+
+
+@event.listens_for(Engine, "connect")
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked, PostgreSQL always enforces them
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture(autouse=True)
+def database():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    coupon_cache.clear()
+    principal_cache.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def run():
+    # Each test drives its coroutine on a fresh event loop; pooled connections belong to that loop
+    def run(coroutine):
+        async def main():
+            # Connect once up front: concurrent first connects on a fresh pool can deadlock in SQLAlchemy 1.4
+            async with async_engine.connect():
+                pass
+            try:
+                return await coroutine
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # Without the context manager the startup hooks and their background loops do not run
+    yield TestClient(app)
+    asyncio.run(async_engine.dispose())
+
+
+def auth_headers(email: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+@pytest.fixture
+def statements():
+    counter = StatementCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+from sqlalchemy import select, update
+
+from db.config import AsyncSessionLocal
+from models.models import Cart, CartItem, Coupon, Pizza
+from services.pricing import apply_cart_delta, reconcile_cart_totals, reprice_carts
+
+
+def seed(db, total_price_cents, discounted_price_cents, with_coupon):
+    pizza = Pizza(name="Margherita", price_cents=total_price_cents)
+    coupon = Coupon(code="BIG", discount_cents=300, expiration_date=date.today() + timedelta(days=1))
+    db.add_all([pizza, coupon])
+    db.flush()
+    cart = Cart(
+        total_price_cents=total_price_cents,
+        discounted_price_cents=discounted_price_cents,
+        coupon_id=coupon.id if with_coupon else None,
+    )
+    db.add(cart)
+    db.flush()
+    db.add(CartItem(cart_id=cart.id, pizza_id=pizza.id, quantity=1))
+    db.commit()
+    return cart.id, pizza.id
+
+
+async def prices(cart_id):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Cart.total_price_cents, Cart.discounted_price_cents).filter(Cart.id == cart_id)
+        )
+        return tuple(result.one())
+
+
+async def shift(cart_id, delta):
+    async with AsyncSessionLocal() as session:
+        await apply_cart_delta(cart_id, delta, session)
+        await session.commit()
+    return await prices(cart_id)
+
+
+def test_delta_after_clamp_keeps_the_coupon_discount(db, run):
+    # A 300 cent coupon on a 200 cent cart clamps the discounted price at zero
+    cart_id, _ = seed(db, total_price_cents=200, discounted_price_cents=0, with_coupon=True)
+
+    async def scenario():
+        return [await shift(cart_id, 1000), await shift(cart_id, -1000), await shift(cart_id, 50)]
+
+    assert run(scenario()) == [(1200, 900), (200, 0), (250, 0)]
+
+
+def test_delta_without_coupon_tracks_the_total(db, run):
+    cart_id, _ = seed(db, total_price_cents=200, discounted_price_cents=200, with_coupon=False)
+
+    async def scenario():
+        return [await shift(cart_id, 1000), await shift(cart_id, -1200)]
+
+    assert run(scenario()) == [(1200, 1200), (0, 0)]
+
+
+def test_reprice_and_reconcile_use_the_coupon_discount(db, run):
+    cart_id, pizza_id = seed(db, total_price_cents=200, discounted_price_cents=0, with_coupon=True)
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(Pizza).filter(Pizza.id == pizza_id).values(price_cents=1000))
+            await session.commit()
+            await reprice_carts(session, pizza_ids=[pizza_id])
+        repriced = await prices(cart_id)
+
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(Pizza).filter(Pizza.id == pizza_id).values(price_cents=2000))
+            await session.commit()
+            stats = await reconcile_cart_totals(session)
+        return repriced, stats, await prices(cart_id)
+
+    repriced, stats, reconciled = run(scenario())
+    assert repriced == (1000, 700)
+    assert stats == {"checked": 1, "repaired": 1}
+    assert reconciled == (2000, 1700)
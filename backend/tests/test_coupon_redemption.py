@@ -0,0 +1,182 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from db.config import AsyncSessionLocal
+from models.models import Cart, CartItem, Coupon, CouponUsage, OrderCoupon, Pizza, User
+from services.cart import apply_coupon_to_cart, checkout_cart, remove_coupon_from_cart, remove_item_from_cart
+from services.coupons import delete_coupon
+from tests.conftest import auth_headers
+
+PIZZA_PRICE_CENTS = 1000
+
+
+def seed(db, users, usage_limit):
+    db.add(Pizza(name="Margherita", price_cents=PIZZA_PRICE_CENTS))
+    db.add(Coupon(code="ONCE", discount_cents=300, expiration_date=date.today() + timedelta(days=1), usage_limit=usage_limit))
+    carts = []
+    for index in range(users):
+        user = User(name=f"user {index}", email=f"user{index}@example.com", password="x", role="user")
+        cart = Cart(user=user, total_price_cents=0, discounted_price_cents=0)
+        db.add_all([user, cart])
+        carts.append(cart)
+    db.commit()
+    return [cart.id for cart in carts]
+
+
+async def fill_cart(cart_id):
+    async with AsyncSessionLocal() as session:
+        session.add(CartItem(cart_id=cart_id, pizza_id=1, quantity=1))
+        cart = await session.get(Cart, cart_id)
+        cart.total_price_cents = PIZZA_PRICE_CENTS
+        if cart.coupon_id is None:
+            cart.discounted_price_cents = PIZZA_PRICE_CENTS
+        await session.commit()
+
+
+async def attempt(action, *args):
+    # Each step gets its own session, like separate requests; refused steps are expected
+    async with AsyncSessionLocal() as session:
+        try:
+            await action(*args, session)
+            return True
+        except Exception:
+            return False
+
+
+async def redeemed_state():
+    async with AsyncSessionLocal() as session:
+        orders_with_coupon = await session.scalar(select(func.count(OrderCoupon.id)))
+        carts_with_coupon = await session.scalar(select(func.count(Cart.id)).filter(Cart.coupon_id.isnot(None)))
+        remaining = await session.scalar(select(Coupon.usage_limit))
+        used_rows = await session.scalar(select(func.count(CouponUsage.id)).filter(CouponUsage.usage_limit == 0))
+        return orders_with_coupon, carts_with_coupon, remaining, used_rows
+
+
+def test_coupon_consumed_by_checkout_cannot_be_given_back(db, run):
+    (cart_id,) = seed(db, users=1, usage_limit=1)
+
+    async def scenario():
+        await fill_cart(cart_id)
+        assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        assert await attempt(checkout_cart, cart_id)
+
+        # The old exploit: remove the coupon from the emptied cart, then apply and check out again
+        assert not await attempt(remove_coupon_from_cart, cart_id)
+        await fill_cart(cart_id)
+        assert not await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        assert await attempt(checkout_cart, cart_id)
+        return await redeemed_state()
+
+    orders_with_coupon, carts_with_coupon, remaining, used_rows = run(scenario())
+    assert orders_with_coupon == 1
+    assert carts_with_coupon == 0
+    assert remaining == 0
+    assert used_rows == 1
+
+
+def test_removing_an_unused_coupon_gives_the_redemption_back(db, run):
+    (cart_id,) = seed(db, users=1, usage_limit=1)
+
+    async def scenario():
+        await fill_cart(cart_id)
+        assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        assert not await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        assert await attempt(remove_coupon_from_cart, cart_id)
+        assert not await attempt(remove_coupon_from_cart, cart_id)
+        assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        assert await attempt(checkout_cart, cart_id)
+        return await redeemed_state()
+
+    orders_with_coupon, carts_with_coupon, remaining, used_rows = run(scenario())
+    assert orders_with_coupon == 1
+    assert remaining == 0
+
+
+@pytest.mark.parametrize("usage_limit", [1, 3])
+def test_parallel_apply_remove_checkout_never_over_redeems(db, run, usage_limit):
+    cart_ids = seed(db, users=8, usage_limit=usage_limit)
+
+    async def shopper(cart_id):
+        # Interleave every coupon operation the API allows, many times, against every other shopper
+        for _ in range(5):
+            await fill_cart(cart_id)
+            await asyncio.gather(
+                attempt(apply_coupon_to_cart, cart_id, "ONCE"),
+                attempt(remove_coupon_from_cart, cart_id),
+                attempt(apply_coupon_to_cart, cart_id, "ONCE"),
+                attempt(checkout_cart, cart_id),
+                attempt(remove_coupon_from_cart, cart_id),
+            )
+
+    async def scenario():
+        await asyncio.gather(*(shopper(cart_id) for cart_id in cart_ids))
+        return await redeemed_state()
+
+    orders_with_coupon, carts_with_coupon, remaining, used_rows = run(scenario())
+    # Every redemption is held by exactly one order or one open cart, never more than the coupon allows
+    assert orders_with_coupon <= usage_limit
+    assert orders_with_coupon + carts_with_coupon == usage_limit - remaining
+    assert used_rows == orders_with_coupon + carts_with_coupon
+    assert remaining >= 0
+
+
+def test_legacy_order_route_charges_the_discounted_price(db, run, client):
+    (cart_id,) = seed(db, users=1, usage_limit=1)
+
+    async def prepare():
+        await fill_cart(cart_id)
+        assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+
+    run(prepare())
+    response = client.post("/api/orders/", headers=auth_headers("user0@example.com"))
+    assert response.status_code == 200
+    order = response.json()["data"]
+    assert order["total_price_cents"] == PIZZA_PRICE_CENTS - 300
+
+    orders_with_coupon, carts_with_coupon, remaining, used_rows = run(redeemed_state())
+    assert (orders_with_coupon, carts_with_coupon, remaining, used_rows) == (1, 0, 0, 1)
+    cart = db.get(Cart, cart_id)
+    db.refresh(cart)
+    assert (cart.total_price_cents, cart.discounted_price_cents, cart.coupon_id) == (0, 0, None)
+
+
+def test_deleting_a_coupon_releases_carts_and_keeps_orders(db, run):
+    cart_ids = seed(db, users=2, usage_limit=5)
+
+    async def scenario():
+        for cart_id in cart_ids:
+            await fill_cart(cart_id)
+            assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        # The first shopper checks out, the second still holds the coupon in an open cart
+        assert await attempt(checkout_cart, cart_ids[0])
+        async with AsyncSessionLocal() as session:
+            await delete_coupon(1, session)
+        async with AsyncSessionLocal() as session:
+            cart = await session.get(Cart, cart_ids[1])
+            order_coupons = (await session.execute(select(OrderCoupon))).scalars().all()
+            usages = await session.scalar(select(func.count(CouponUsage.id)))
+            coupons = await session.scalar(select(func.count(Coupon.id)))
+            return cart, order_coupons, usages, coupons
+
+    cart, order_coupons, usages, coupons = run(scenario())
+    assert (cart.coupon_id, cart.discounted_price_cents) == (None, cart.total_price_cents)
+    assert [order_coupon.coupon_id for order_coupon in order_coupons] == [None]
+    assert (usages, coupons) == (0, 0)
+
+
+def test_removing_the_last_item_gives_the_coupon_back(db, run):
+    (cart_id,) = seed(db, users=1, usage_limit=1)
+
+    async def scenario():
+        await fill_cart(cart_id)
+        assert await attempt(apply_coupon_to_cart, cart_id, "ONCE")
+        async with AsyncSessionLocal() as session:
+            result = await remove_item_from_cart(1, 1, session)
+            assert "cart deleted" in result["message"]
+        return await redeemed_state()
+
+    orders_with_coupon, carts_with_coupon, remaining, used_rows = run(scenario())
+    assert (orders_with_coupon, carts_with_coupon, remaining, used_rows) == (0, 0, 1, 0)
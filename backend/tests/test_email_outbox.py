@@ -0,0 +1,187 @@
+import asyncio
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import select, update
+
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import EmailOutbox, Order, User
+from services import email
+from services.email import drain_email_outbox, enqueue_email, retry_delay, send_order_confirmation_service
+
+
+class RecordingHandler:
+    """Accepts mail like a real server, except for recipients told to fail."""
+
+    def __init__(self):
+        self.delivered = []
+        self.failures = {}  # recipient -> attempts left to reject with a temporary error
+
+    async def handle_DATA(self, server, session, envelope):
+        for recipient in envelope.rcpt_tos:
+            if self.failures.get(recipient, 0) > 0:
+                self.failures[recipient] -= 1
+                return "451 Temporary failure, try again later"
+        self.delivered.append((envelope.rcpt_tos, envelope.content.decode()))
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    monkeypatch.setattr(email.smtp_pool, "host", controller.hostname)
+    monkeypatch.setattr(email.smtp_pool, "port", controller.port)
+    monkeypatch.setattr(email.smtp_pool, "starttls", False)
+    monkeypatch.setattr(email.smtp_pool, "username", None)
+    monkeypatch.setattr(settings, "EMAIL_WORKERS", 2)
+    monkeypatch.setattr(settings, "EMAIL_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "EMAIL_RETRY_BASE_SECONDS", 30)
+    yield handler
+    email.smtp_pool.close_all()
+    controller.stop()
+
+
+async def queue(*recipients):
+    async with AsyncSessionLocal() as session:
+        for recipient in recipients:
+            enqueue_email("Your order", f"<p>Hello {recipient}</p>", recipient, session)
+        await session.commit()
+
+
+async def drain():
+    async with AsyncSessionLocal() as session:
+        return await drain_email_outbox(session)
+
+
+async def outbox():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(EmailOutbox).order_by(EmailOutbox.id))
+        return {message.recipient: message for message in result.scalars().all()}
+
+
+async def make_due():
+    # Stand-in for waiting out the backoff
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(EmailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+
+
+def test_queued_messages_are_sent_over_pooled_connections(smtp_server, run):
+    recipients = [f"customer{index}@example.com" for index in range(6)]
+
+    async def scenario():
+        await queue(*recipients)
+        return await drain(), await drain(), await outbox()
+
+    connects = email.smtp_pool.connects
+    stats, again, messages = run(scenario())
+
+    assert stats == {"claimed": 6, "sent": 6, "failed": 0}
+    assert again == {"claimed": 0, "sent": 0, "failed": 0}
+    assert sorted(rcpt for (rcpt,), _ in smtp_server.delivered) == recipients
+    assert "Subject: Your order" in smtp_server.delivered[0][1]
+    assert all(message.status == "Sent" and message.attempts == 1 for message in messages.values())
+    # One connection per sender thread, not one per message
+    assert email.smtp_pool.connects - connects == settings.EMAIL_WORKERS
+
+
+def test_temporary_failure_is_retried_after_backoff(smtp_server, run):
+    smtp_server.failures["flaky@example.com"] = 1
+
+    async def scenario():
+        await queue("flaky@example.com", "fine@example.com")
+        first = await drain()
+        after_first = await outbox()
+        # Not due yet, nothing is claimed until the backoff has passed
+        early = await drain()
+        await make_due()
+        second = await drain()
+        return first, after_first, early, second, await outbox()
+
+    started = datetime.utcnow()
+    first, after_first, early, second, messages = run(scenario())
+
+    assert first == {"claimed": 2, "sent": 1, "failed": 1}
+    flaky = after_first["flaky@example.com"]
+    assert flaky.status == "Pending"
+    assert flaky.attempts == 1
+    assert "451" in flaky.last_error
+    assert flaky.next_attempt_at >= started + retry_delay(1) - timedelta(seconds=1)
+    assert early == {"claimed": 0, "sent": 0, "failed": 0}
+    assert second == {"claimed": 1, "sent": 1, "failed": 0}
+    assert messages["flaky@example.com"].status == "Sent"
+    assert messages["flaky@example.com"].attempts == 2
+
+
+def test_message_fails_after_max_attempts(smtp_server, run):
+    smtp_server.failures["bounce@example.com"] = 100
+
+    async def scenario():
+        await queue("bounce@example.com")
+        delays = []
+        for _ in range(settings.EMAIL_MAX_ATTEMPTS):
+            await make_due()
+            before = datetime.utcnow()
+            assert await drain() == {"claimed": 1, "sent": 0, "failed": 1}
+            delays.append((await outbox())["bounce@example.com"].next_attempt_at - before)
+        await make_due()
+        return delays, await drain(), await outbox()
+
+    delays, after_failed, messages = run(scenario())
+
+    # Backoff doubles after every attempt
+    for attempts, delay in enumerate(delays, start=1):
+        assert abs(delay - retry_delay(attempts)) < timedelta(seconds=2)
+    assert [retry_delay(n).total_seconds() for n in (1, 2, 3)] == [30, 60, 120]
+    bounce = messages["bounce@example.com"]
+    assert bounce.status == "Failed"
+    assert bounce.attempts == settings.EMAIL_MAX_ATTEMPTS
+    assert after_failed == {"claimed": 0, "sent": 0, "failed": 0}
+    assert smtp_server.delivered == []
+
+
+def test_resending_a_confirmation_leaves_the_order_status_alone(db, run):
+    user = User(name="u", email="u@example.com", password="x", role="user")
+    db.add(user)
+    db.flush()
+    order = Order(user_id=user.id, status="Preparing", total_price_cents=1000)
+    db.add(order)
+    db.commit()
+    order_id = order.id
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            await send_order_confirmation_service(order_id, session)
+        async with AsyncSessionLocal() as session:
+            return (await session.get(Order, order_id)).status, await outbox()
+
+    status, messages = run(scenario())
+
+    assert status == "Preparing"
+    assert messages["u@example.com"].status == "Pending"
+
+
+def test_concurrent_drains_send_each_message_once(smtp_server, run):
+    recipients = [f"customer{index}@example.com" for index in range(20)]
+
+    async def scenario():
+        await queue(*recipients)
+        stats = await asyncio.gather(*[drain() for _ in range(4)])
+        return stats, await outbox()
+
+    stats, messages = run(scenario())
+
+    assert sum(stat["claimed"] for stat in stats) == len(recipients)
+    assert sorted(rcpt for (rcpt,), _ in smtp_server.delivered) == sorted(recipients)
+    assert all(message.status == "Sent" and message.attempts == 1 for message in messages.values())
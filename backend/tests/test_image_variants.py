@@ -0,0 +1,71 @@
+import pytest
+from PIL import Image
+
+from db.config import AsyncSessionLocal
+from models.models import Pizza
+from schemas.pizza import PizzaCreateUpdate
+from utils import images
+from services import pizza as pizza_service
+from services.pizza import build_image_variants, update_pizza
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pizza_service, "get_upload_path", lambda: str(tmp_path))
+    yield tmp_path
+    images.shutdown_image_pool()
+
+
+def test_variants_are_rendered_in_workers_that_are_not_forked(upload_dir, run):
+    # A noisy image compresses badly as JPEG, so every smaller variant is kept
+    Image.effect_noise((1600, 1200), 64).convert("RGB").save(upload_dir / "big.jpg", quality=95)
+
+    variants = run(build_image_variants("/static/images/big.jpg"))
+
+    assert set(variants) == set(images.IMAGE_VARIANTS)
+    for url in variants.values():
+        assert (upload_dir / "derived" / url.rsplit("/", 1)[1]).exists()
+    assert images.get_image_pool()._mp_context.get_start_method() == "forkserver"
+
+
+def test_undecodable_image_is_marked_and_not_retried(db, upload_dir, run, monkeypatch):
+    (upload_dir / "broken.jpg").write_bytes(b"not an image")
+    assert run(build_image_variants("/static/images/broken.jpg")) == {}
+
+    db.add(Pizza(name="Broken", price_cents=1000, image="/static/images/broken.jpg", image_variants={}))
+    db.commit()
+
+    attempts = []
+
+    async def generate_variants(*args):
+        attempts.append(args)
+        return {}
+
+    monkeypatch.setattr(pizza_service, "generate_variants", generate_variants)
+
+    async def edit():
+        async with AsyncSessionLocal() as session:
+            data = PizzaCreateUpdate(name="Broken", description="Still broken", price=11)
+            return await update_pizza(1, data, session)
+
+    pizza = run(edit())
+    assert pizza.image_variants == {}
+    assert attempts == []
+
+
+def test_concurrent_jobs_for_the_same_image_publish_complete_files(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    Image.effect_noise((1200, 900), 64).convert("RGB").save(tmp_path / "same.jpg", quality=95)
+    output_dir = tmp_path / "derived"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        jobs = [executor.submit(images.render_variants, str(tmp_path / "same.jpg"), str(output_dir), 70) for _ in range(8)]
+        results = [job.result() for job in jobs]
+
+    assert all(result == results[0] for result in results)
+    assert sorted(path.name for path in output_dir.iterdir()) == sorted(results[0].values())
+    for filename in results[0].values():
+        with Image.open(output_dir / filename) as variant:
+            variant.load()
+        assert (output_dir / filename).stat().st_mode & 0o777 == 0o644
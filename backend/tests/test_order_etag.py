@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models.models import Order, OrderItem, OrderTopping, Pizza, Topping, User
+
+# Timestamps are set explicitly, SQLite only keeps whole seconds for CURRENT_TIMESTAMP
+CREATED = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def seed(db):
+    user = User(name="u", email="u@example.com", password="x", role="user")
+    pizza = Pizza(name="Margherita", price_cents=1000, updated_at=CREATED)
+    topping = Topping(name="Basil", price_cents=100, updated_at=CREATED)
+    db.add_all([user, pizza, topping])
+    db.flush()
+    order = Order(user_id=user.id, status="Received", total_price_cents=1100, updated_at=CREATED)
+    item = OrderItem(pizza_id=pizza.id, quantity=1)
+    item.order_toppings = [OrderTopping(topping_id=topping.id, quantity=1)]
+    order.order_items.append(item)
+    db.add(order)
+    db.commit()
+    return order.id, pizza.id, topping.id
+
+
+def change(db, model, row_id, seconds, **values):
+    db.execute(
+        update(model).filter(model.id == row_id).values(updated_at=CREATED + timedelta(seconds=seconds), **values)
+    )
+    db.commit()
+
+
+def test_order_etag_changes_with_referenced_menu_items(db, client):
+    order_id, pizza_id, topping_id = seed(db)
+
+    first = client.get(f"/api/orders/{order_id}")
+    etag = first.headers["etag"]
+    assert client.get(f"/api/orders/{order_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    # A pizza price change alters the item price in the response, so the cached copy is stale
+    change(db, Pizza, pizza_id, 10, price_cents=1200)
+    second = client.get(f"/api/orders/{order_id}", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.json()["data"]["items"][0]["item_price"] == 12.0
+    assert second.headers["etag"] != etag
+    assert second.headers["last-modified"] == "Thu, 01 Jan 2026 12:00:10 GMT"
+
+    etag = second.headers["etag"]
+    change(db, Topping, topping_id, 20, name="Fresh basil")
+    third = client.get(f"/api/orders/{order_id}", headers={"If-None-Match": etag})
+    assert third.status_code == 200
+    assert third.json()["data"]["items"][0]["toppings"][0]["topping_name"] == "Fresh basil"
+
+    # If-Modified-Since falls back to the newest of the order and its menu items
+    last_modified = third.headers["last-modified"]
+    assert client.get(f"/api/orders/{order_id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+
+def test_unrelated_menu_changes_keep_the_order_etag(db, client):
+    order_id, _, _ = seed(db)
+    other = Pizza(name="Marinara", price_cents=900, updated_at=CREATED)
+    db.add(other)
+    db.commit()
+
+    etag = client.get(f"/api/orders/{order_id}").headers["etag"]
+    change(db, Pizza, other.id, 10, price_cents=950)
+    assert client.get(f"/api/orders/{order_id}", headers={"If-None-Match": etag}).status_code == 304
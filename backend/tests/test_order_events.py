@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import delete, update
+
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import Order, User
+from services.order import delete_order_for_admin, stream_order_status
+from tests.conftest import auth_headers
+
+
+@pytest.fixture(autouse=True)
+def fast_streams(monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_EVENTS_KEEPALIVE_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "ORDER_EVENTS_RECHECK_SECONDS", 0.2)
+
+
+def seed(db):
+    user = User(name="u", email="u@example.com", password="x", role="user")
+    db.add(user)
+    db.flush()
+    order = Order(user_id=user.id, status="Received", total_price_cents=1000)
+    db.add(order)
+    db.commit()
+    return order.id
+
+
+def parse(chunk):
+    if chunk.startswith(":"):
+        return "keepalive", None
+    event, data = chunk.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def collect(order_id, on_first_event=None):
+    events = []
+
+    async def consume():
+        async for chunk in stream_order_status(order_id):
+            events.append(parse(chunk))
+            if len(events) == 1 and on_first_event:
+                await on_first_event()
+
+    # The stream must end on its own
+    await asyncio.wait_for(consume(), timeout=5)
+    return [event for event in events if event[0] != "keepalive"]
+
+
+def test_unknown_order_ends_with_a_deleted_event(run):
+    assert run(collect(404)) == [("deleted", {"order_id": 404})]
+
+
+def test_deleting_the_order_ends_the_stream(db, run):
+    order_id = seed(db)
+
+    async def delete_order():
+        async with AsyncSessionLocal() as session:
+            await delete_order_for_admin(order_id, session)
+
+    events = run(collect(order_id, on_first_event=delete_order))
+    assert [name for name, _ in events] == ["status", "deleted"]
+    assert events[0][1]["status"] == "Received"
+
+
+def test_order_deleted_without_an_event_is_noticed_by_the_recheck(db, run):
+    order_id = seed(db)
+
+    async def delete_behind_the_streams_back():
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(Order).filter(Order.id == order_id))
+            await session.commit()
+
+    events = run(collect(order_id, on_first_event=delete_behind_the_streams_back))
+    assert [name for name, _ in events] == ["status", "deleted"]
+
+
+def test_events_route_is_only_open_to_the_owner_and_admins(db, client):
+    order_id = seed(db)
+    db.add_all([
+        User(name="o", email="other@example.com", password="x", role="user"),
+        User(name="a", email="admin@example.com", password="x", role="admin"),
+    ])
+    db.execute(update(Order).filter(Order.id == order_id).values(status="Completed"))
+    db.commit()
+    url = f"/api/orders/{order_id}/events"
+
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=auth_headers("other@example.com")).status_code == 403
+    assert client.get("/api/orders/404/events", headers=auth_headers("u@example.com")).status_code == 404
+    # A completed order streams its status once and the response ends
+    for email in ("u@example.com", "admin@example.com"):
+        response = client.get(url, headers=auth_headers(email))
+        assert response.status_code == 200
+        assert [parse(chunk)[0] for chunk in response.text.split("\n\n") if chunk] == ["status"]
+
+
+def test_missed_status_change_is_picked_up_by_the_recheck(db, run):
+    order_id = seed(db)
+
+    async def complete_without_an_event():
+        async with AsyncSessionLocal() as session:
+            await session.execute(update(Order).filter(Order.id == order_id).values(status="Completed"))
+            await session.commit()
+
+    events = run(collect(order_id, on_first_event=complete_without_an_event))
+    assert [(name, data["status"]) for name, data in events] == [("status", "Received"), ("status", "Completed")]
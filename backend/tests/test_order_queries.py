@@ -0,0 +1,64 @@
+from db.config import AsyncSessionLocal
+from models.models import Order, OrderItem, OrderTopping, Pizza, Topping, User
+from services.order import get_all_orders_for_user, get_order_by_id
+
+# orders, items, pizzas, order toppings, toppings
+ORDER_GRAPH_QUERIES = 5
+
+
+def add_order(db, user_id, items, toppings_per_item):
+    order = Order(user_id=user_id, status="Received", total_price_cents=0)
+    for index in range(items):
+        item = OrderItem(pizza_id=index % 3 + 1, quantity=1)
+        item.order_toppings = [
+            OrderTopping(topping_id=(index + offset) % 3 + 1, quantity=1) for offset in range(toppings_per_item)
+        ]
+        order.order_items.append(item)
+    db.add(order)
+    db.commit()
+    return order.id
+
+
+def seed(db):
+    user = User(name="u", email="u@example.com", password="x")
+    db.add(user)
+    db.add_all([Pizza(name=f"Pizza {i}", price_cents=1000) for i in range(3)])
+    db.add_all([Topping(name=f"Topping {i}", price_cents=100) for i in range(3)])
+    db.commit()
+    return user.id
+
+
+def count_queries(run, statements, read):
+    async def measure():
+        async with AsyncSessionLocal() as session:
+            before = statements.count
+            data = await read(session)
+            return statements.count - before, data
+
+    return run(measure())
+
+
+def test_get_order_by_id_query_count_does_not_grow_with_items(db, run, statements):
+    user_id = seed(db)
+    small = add_order(db, user_id, items=1, toppings_per_item=1)
+    large = add_order(db, user_id, items=30, toppings_per_item=3)
+
+    small_queries, small_order = count_queries(run, statements, lambda session: get_order_by_id(small, session))
+    large_queries, large_order = count_queries(run, statements, lambda session: get_order_by_id(large, session))
+
+    assert small_queries == large_queries == ORDER_GRAPH_QUERIES
+    assert len(large_order["items"]) == 30
+    assert all(len(item["toppings"]) == 3 for item in large_order["items"])
+
+
+def test_get_all_orders_for_user_query_count_does_not_grow_with_orders(db, run, statements):
+    user_id = seed(db)
+    add_order(db, user_id, items=2, toppings_per_item=1)
+    one_order_queries, _ = count_queries(run, statements, lambda session: get_all_orders_for_user(user_id, session))
+
+    for _ in range(49):
+        add_order(db, user_id, items=5, toppings_per_item=2)
+    many_queries, response = count_queries(run, statements, lambda session: get_all_orders_for_user(user_id, session))
+
+    assert one_order_queries == many_queries == ORDER_GRAPH_QUERIES
+    assert len(response["data"]) == 50
@@ -0,0 +1,20 @@
+from db.config import AsyncSessionLocal
+from models.models import Pizza
+from schemas.pizza import PizzaCreateUpdate
+from services.pizza import update_pizza
+
+
+def test_partial_update_keeps_the_price(db, run):
+    db.add(Pizza(name="Margherita", description="Classic", price_cents=1000, image_variants={}))
+    db.commit()
+
+    async def edit(**fields):
+        async with AsyncSessionLocal() as session:
+            return await update_pizza(1, PizzaCreateUpdate(**fields), session)
+
+    pizza = run(edit(description="Tomato and basil"))
+    assert (pizza.name, pizza.description, pizza.price_cents) == ("Margherita", "Tomato and basil", 1000)
+    pizza = run(edit(name=None, price=None))
+    assert (pizza.name, pizza.price_cents) == ("Margherita", 1000)
+    pizza = run(edit(price=12.5))
+    assert pizza.price_cents == 1250
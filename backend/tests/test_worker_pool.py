@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.worker_pool import BoundedWorkerPool
+
+
+def test_only_successful_jobs_count_as_completed(run):
+    pool = BoundedWorkerPool("test-pool", max_workers=1, max_queue=4)
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("boom")
+
+    async def scenario():
+        assert await pool.run(lambda: 42) == 42
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+
+        # A caller giving up while the job is still running
+        blocked = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        blocked.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await blocked
+        release.set()
+
+    run(scenario())
+    stats = pool.stats()
+    assert stats["completed"] == 1
+    assert stats["failed"] == 2
+    assert stats["in_flight"] == 0
@@ -0,0 +1,64 @@
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from core.config import settings
+from utils.event_bus import event_bus
+
+
+class VersionedSnapshot:
+    """
+    Process-local snapshot of rarely changing data, guarded by a version counter.
+
+    Writers call `invalidate()` to bump the version and the next reader rebuilds
+    the snapshot. Snapshots also expire after `max_age_seconds`, which bounds how
+    long changes made through another worker process stay invisible here.
+    """
+
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self.version = 0
+        self.builds = 0
+        self.hits = 0
+        self._snapshot: Any = None
+        self._built_version: Optional[int] = None
+        self._built_at = 0.0
+
+    def invalidate(self) -> None:
+        self.version += 1
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._built_version == self.version
+            and time.monotonic() - self._built_at < self.max_age_seconds
+        )
+
+    async def get(self, build: Callable[[int], Awaitable[Any]]) -> Any:
+        if self._is_fresh():
+            self.hits += 1
+            return self._snapshot
+
+        # Concurrent misses may build twice, which is harmless; a snapshot built
+        # while the version moved on is stored under its old version and rebuilt next time
+        version = self.version
+        snapshot = await build(version)
+        self._snapshot, self._built_version, self._built_at = snapshot, version, time.monotonic()
+        self.builds += 1
+        return snapshot
+
+    def stats(self) -> dict:
+        return {"version": self.version, "builds": self.builds, "hits": self.hits}
+
+
+# Menu (pizzas and toppings), invalidated by the pizza and topping admin services
+menu_catalog = VersionedSnapshot(max_age_seconds=settings.MENU_CATALOG_MAX_AGE_SECONDS)
+
+MENU_CHANNEL = "menu"
+
+
+# Drop the menu snapshot in this worker right away and in the others through the event bus
+def invalidate_menu():
+    event_bus.publish(MENU_CHANNEL, {})
+
+
+event_bus.subscribe(MENU_CHANNEL, lambda payload: menu_catalog.invalidate())
+event_bus.on_resync(menu_catalog.invalidate)
@@ -1,14 +1,14 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from utils.jwt import is_admin,is_user
-from core.auth import oauth2_scheme
+from core.auth import oauth2_scheme, optional_oauth2_scheme
 from os import path
 import os
 from db.config import get_db
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 # Admin Check Dependency
-def admin_required(db: Session = Depends(get_db),token: str = Depends(oauth2_scheme)):
-    return is_admin(token,db)
+async def admin_required(db: AsyncSession = Depends(get_db),token: str = Depends(oauth2_scheme)):
+    return await is_admin(token,db)
 
 
 def get_upload_path():
@@ -18,5 +18,12 @@ def get_upload_path():
     return upload_dir
 
 
-def user_required(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    return is_user(token,db)
\ No newline at end of file
+async def user_required(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    return await is_user(token,db)
+
+
+# Signed-in user if a bearer token was sent, None for anonymous callers
+async def optional_user(db: AsyncSession = Depends(get_db), token: str = Depends(optional_oauth2_scheme)):
+    if not token:
+        return None
+    return await is_user(token,db)
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, DefaultDict, List
+
+from sqlalchemy.engine import make_url
+
+from core.config import settings
+from db.config import ASYNC_DATABASE_URL
+
+Handler = Callable[[dict], Any]
+
+
+class InMemoryEventBus:
+    """
+    Event bus for a single process: published events go straight to the local handlers.
+
+    Used with SQLite and in tests. It is also the base of PostgresEventBus, so
+    the publishing worker always sees its own events immediately.
+    """
+
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self._handlers: DefaultDict[str, List[Handler]] = defaultdict(list)
+        self._resync_handlers: List[Callable[[], Any]] = []
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers[channel].append(handler)
+
+    def on_resync(self, handler: Callable[[], Any]) -> None:
+        # Called when events from other workers may have been missed, e.g. after a reconnect
+        self._resync_handlers.append(handler)
+
+    def publish(self, channel: str, payload: dict) -> None:
+        """Deliver an event to this worker's handlers now and to other workers, if any."""
+        self.published += 1
+        self._dispatch(channel, payload)
+
+    def _dispatch(self, channel: str, payload: dict) -> None:
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"Error handling {channel} event: {str(e)}")
+
+    def _resync(self) -> None:
+        for handler in self._resync_handlers:
+            try:
+                handler()
+            except Exception as e:
+                print(f"Error resyncing after missed events: {str(e)}")
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "channels": sorted(self._handlers),
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+class PostgresEventBus(InMemoryEventBus):
+    """
+    Event bus fanning events out to every worker through PostgreSQL LISTEN/NOTIFY.
+
+    One dedicated asyncpg connection per worker listens on all channels and sends
+    this worker's events; queued events are sent in one round trip. Each event
+    carries the id of the worker that published it, so a worker skips its own
+    events when they come back. If the connection drops it is re-established
+    and the resync handlers run, since notifications sent meanwhile are lost.
+    """
+
+    def __init__(self, dsn: str, ping_seconds: float = 30.0, retry_seconds: float = 5.0):
+        super().__init__()
+        self.dsn = dsn
+        self.ping_seconds = ping_seconds
+        self.retry_seconds = retry_seconds
+        self.worker_id = uuid.uuid4().hex
+        self.reconnects = 0
+        self._outgoing: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._task = None
+
+    def publish(self, channel: str, payload: dict) -> None:
+        message = json.dumps({"worker": self.worker_id, "payload": payload})
+        if len(message.encode()) >= 8000:
+            # NOTIFY payloads are limited to 8000 bytes, events should carry ids rather than data
+            raise ValueError(f"Event too large for NOTIFY on channel {channel}")
+        super().publish(channel, payload)
+        self._outgoing.put_nowait((channel, message))
+
+    def _notify(self, connection, pid, channel, message) -> None:
+        event = json.loads(message)
+        if event["worker"] == self.worker_id:
+            return
+        self.received += 1
+        self._dispatch(channel, event["payload"])
+
+    async def _run(self) -> None:
+        # Imported here so SQLite setups do not need the PostgreSQL driver
+        import asyncpg
+
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                for channel in self._handlers:
+                    await connection.add_listener(channel, self._notify)
+                if connected_before:
+                    self.reconnects += 1
+                    self._resync()
+                connected_before = True
+
+                while True:
+                    try:
+                        batch = [await asyncio.wait_for(self._outgoing.get(), timeout=self.ping_seconds)]
+                    except asyncio.TimeoutError:
+                        # Idle: make sure the connection is still alive, or notifications are silently lost
+                        await connection.execute("SELECT 1")
+                        continue
+                    while not self._outgoing.empty():
+                        batch.append(self._outgoing.get_nowait())
+                    try:
+                        await connection.executemany("SELECT pg_notify($1, $2)", batch)
+                    except Exception:
+                        # Keep the events for the next connection
+                        for event in batch:
+                            self._outgoing.put_nowait(event)
+                        raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event bus connection lost, retrying in {self.retry_seconds}s: {str(e)}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(self.retry_seconds)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(backend="postgres", pending=self._outgoing.qsize(), reconnects=self.reconnects)
+        return stats
+
+
+def create_event_bus():
+    # "auto" fans out through PostgreSQL when the database is PostgreSQL, otherwise stays in-process
+    url = make_url(ASYNC_DATABASE_URL)
+    backend = settings.EVENT_BUS_BACKEND
+    if backend == "auto":
+        backend = "postgres" if url.get_backend_name() == "postgresql" else "memory"
+    if backend == "memory":
+        return InMemoryEventBus()
+    dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+    return PostgresEventBus(
+        dsn,
+        ping_seconds=settings.EVENT_BUS_PING_SECONDS,
+        retry_seconds=settings.EVENT_BUS_RETRY_SECONDS,
+    )
+
+
+# Cache invalidations and order updates shared by all workers
+event_bus = create_event_bus()
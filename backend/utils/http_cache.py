@@ -0,0 +1,70 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# Cache-Control policies
+PUBLIC_SHORT_CACHE = "public, max-age=30"  # Shared menu data, revalidated with the ETag after 30s
+PRIVATE_REVALIDATE = "private, no-cache"  # Per-user data, always revalidated
+
+
+# Same encoding as FastAPI's JSONResponse, so pre-encoded bodies match regular responses
+def encode_json(content) -> bytes:
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def etag_for(*parts) -> str:
+    """Strong ETag over the given values (bytes are hashed as-is)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def http_date(value: datetime) -> str:
+    # Naive timestamps in this app are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None, cache_control: str = PRIVATE_REVALIDATE) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when no ETag was sent (RFC 9110)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" matches "x"
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have second precision
+        return modified.replace(microsecond=0) <= since
+    return False
+
+
+def not_modified(etag: str, last_modified: Optional[datetime] = None, cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified, cache_control))
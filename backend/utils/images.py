@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from core.config import settings
+
+# name -> (max width, format); WebP for current browsers plus a JPEG thumbnail fallback
+IMAGE_VARIANTS = {
+    "thumb": (320, "WEBP"),
+    "card": (800, "WEBP"),
+    "thumb_jpeg": (320, "JPEG"),
+}
+VARIANT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+# Slowest, smallest WebP encoding; it runs once per upload, off the event loop
+ENCODER_OPTIONS = {"WEBP": {"method": 6}, "JPEG": {"optimize": True, "progressive": True}}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    # Created on first use so importing this module does not start workers. Workers are never
+    # forked from the server process, which holds an event loop, threads and open connections
+    global _pool
+    if _pool is None:
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context(start_method),
+        )
+    return _pool
+
+
+def shutdown_image_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def write_file_atomically(file_path: str, data: bytes) -> None:
+    # Each writer gets its own temporary file, concurrent jobs for the same image never share one
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix=".variant-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as target:
+            target.write(data)
+        # mkstemp creates the file owner-only, images are served to everyone
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def render_variants(source_path: str, output_dir: str, quality: int) -> Dict[str, str]:
+    """
+    Write every variant of an image and return {variant name: file name}.
+
+    Runs in a worker process. File names are derived from the encoded bytes,
+    so identical output is stored once and a name never changes meaning.
+    A variant that would not be smaller than the original is skipped, clients
+    fall back to the original image.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    source_size = os.path.getsize(source_path)
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    variants = {}
+    for name, (max_width, image_format) in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        # Only ever shrink, keeping the aspect ratio
+        resized.thumbnail((max_width, max_width * 4), Image.LANCZOS)
+        if image_format == "JPEG" and resized.mode not in ("RGB", "L"):
+            resized = resized.convert("RGB")
+
+        buffer = io.BytesIO()
+        resized.save(buffer, image_format, quality=quality, **ENCODER_OPTIONS[image_format])
+        data = buffer.getvalue()
+        if len(data) >= source_size:
+            continue
+
+        digest = hashlib.blake2b(data, digest_size=8).hexdigest()
+        filename = f"{name}-{digest}.{VARIANT_EXTENSIONS[image_format]}"
+        file_path = os.path.join(output_dir, filename)
+        if not os.path.exists(file_path):
+            write_file_atomically(file_path, data)
+        variants[name] = filename
+    return variants
+
+
+async def generate_variants(source_path: str, output_dir: str) -> Dict[str, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_image_pool(), render_variants, source_path, output_dir, settings.IMAGE_VARIANT_QUALITY
+    )
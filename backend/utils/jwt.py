@@ -1,19 +1,47 @@
+import uuid
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
 from typing import Optional
+from core.config import settings
 from models.models import User
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.cache import TTLCache
+from utils.revocation import token_deny_list
 
 SECRET_KEY = "our_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+
+# Lightweight user record resolved from a token
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    name: str
+    role: str
+
+
+# Authenticated users keyed by token subject (email)
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def invalidate_principal(email: str):
+    """Drop a cached user, e.g. after their role changed."""
+    principal_cache.invalidate(email)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    # Every access token gets a unique id so it can be revoked individually
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict):
@@ -33,7 +61,7 @@ def verify_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-def get_current_user(token: str, db: Session):
+async def get_current_user(token: str, db: AsyncSession):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])  # Assuming you're using JWT
         email = payload.get("sub")  # 'sub' field in JWT is usually the email
@@ -41,27 +69,45 @@ def get_current_user(token: str, db: Session):
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token")
 
+        jti = payload.get("jti")
+        if jti and await token_deny_list.is_revoked(jti, db):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        # In stateless mode the user is built from the verified claims alone
+        user_id = payload.get("uid")
+        role = payload.get("role")
+        if settings.STATELESS_AUTH and user_id is not None and role:
+            return Principal(id=user_id, email=email, name=payload.get("username"), role=role)
+
+        # Serve the user from the principal cache when possible
+        principal = principal_cache.get(email)
+        if principal is not None:
+            return principal
+
         # Query the user by email to get the user details including 'id'
-        user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(select(User).filter(User.email == email))
+        user = result.scalars().first()
 
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        # Return the user object with 'id' field included
-        return user
+        # Return the user record with 'id' field included
+        principal = Principal(id=user.id, email=user.email, name=user.name, role=user.role)
+        principal_cache.set(email, principal)
+        return principal
     # {"id": user.id, "sub": user.email, "role": user.role}
 
     except jwt.JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 # Check if User is Admin
-def is_admin(token: str,db:Session):
-    user = get_current_user(token,db)
+async def is_admin(token: str,db: AsyncSession):
+    user = await get_current_user(token,db)
     if user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized as admin")
     return user
 
-def is_user(token: str,db: Session):
-    user = get_current_user(token,db)
+async def is_user(token: str,db: AsyncSession):
+    user = await get_current_user(token,db)
     if user.role == "admin" or user.role == "user":
         return user
     else:
@@ -0,0 +1,30 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+
+
+# Opaque keyset cursor over (created_at, id)
+def encode_cursor(created_at: datetime, record_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        created_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+# SQLite keeps server-default timestamps as text without microseconds, so compare normalised values there
+def comparable_timestamp(column, dialect_name: str):
+    if dialect_name == "sqlite":
+        return func.datetime(column), lambda value: value.strftime("%Y-%m-%d %H:%M:%S")
+    return column, lambda value: value
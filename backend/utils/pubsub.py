@@ -0,0 +1,58 @@
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, DefaultDict, Hashable, Iterator, Set
+
+from core.config import settings
+
+
+class PubSubHub:
+    """
+    In-process publish/subscribe hub for asyncio code.
+
+    Each subscriber gets its own bounded queue. Publishing never blocks: when a
+    slow subscriber's queue is full its oldest message is dropped, so one stuck
+    client cannot hold up the publisher or the other subscribers.
+    """
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: DefaultDict[Hashable, Set[asyncio.Queue]] = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, topic: Hashable) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[topic].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def publish(self, topic: Hashable, message: Any) -> int:
+        """Deliver a message to every current subscriber of a topic and return how many there were."""
+        subscribers = self._subscribers.get(topic, ())
+        for queue in subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+        self.published += 1
+        return len(subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+# Order status changes keyed by order id, streamed to customers waiting on their order
+order_events = PubSubHub(queue_size=settings.ORDER_EVENTS_QUEUE_SIZE)
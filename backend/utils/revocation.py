@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db.config import AsyncSessionLocal
+from models.models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives, rare false positives)."""
+
+    def __init__(self, size_bits: int, hash_count: int):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self._bits = bytearray((size_bits + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, value: str) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TokenDenyList:
+    """
+    In-memory deny-list of revoked token ids.
+
+    Only a bloom filter is kept in memory; a filter hit is confirmed against the
+    revoked_tokens table. A background task rebuilds the filter from the table
+    periodically, so revocations from other workers are picked up and expired
+    tokens drop out, without putting a query on the request path. Until the
+    first rebuild every check goes to the table.
+    """
+
+    def __init__(self, size_bits: int, hash_count: int, refresh_seconds: float):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self.refresh_seconds = refresh_seconds
+        self._filter = BloomFilter(size_bits, hash_count)
+        self._refreshed_at: Optional[float] = None
+
+    def add(self, jti: str) -> None:
+        self._filter.add(jti)
+
+    def rebuild(self, jtis: Iterable[str]) -> None:
+        new_filter = BloomFilter(self.size_bits, self.hash_count)
+        for jti in jtis:
+            new_filter.add(jti)
+        self._filter = new_filter
+        self._refreshed_at = time.monotonic()
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Delete rows of tokens that have expired anyway, rebuild the filter and return how many were purged."""
+        now = datetime.utcnow()
+        result = await db.execute(
+            delete(RevokedToken)
+            .filter(RevokedToken.expires_at <= now)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        result_jtis = await db.execute(select(RevokedToken.jti).filter(RevokedToken.expires_at > now))
+        self.rebuild(result_jtis.scalars().all())
+        return result.rowcount
+
+    async def is_revoked(self, jti: str, db: AsyncSession) -> bool:
+        if self._refreshed_at is not None and jti not in self._filter:
+            return False
+
+        # Possible hit, confirm against the table to rule out a false positive
+        result = await db.execute(select(RevokedToken.id).filter(RevokedToken.jti == jti))
+        return result.scalars().first() is not None
+
+    async def revoke(self, jti: str, expires_at: datetime, db: AsyncSession) -> None:
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+        await db.commit()
+        self.add(jti)
+
+
+# Background loop started with the app; the first refresh runs before requests are served
+async def run_deny_list_refresher(deny_list: TokenDenyList):
+    while True:
+        await asyncio.sleep(deny_list.refresh_seconds)
+        try:
+            async with AsyncSessionLocal() as db:
+                purged = await deny_list.refresh(db)
+            if purged:
+                print(f"Purged {purged} expired revoked tokens")
+        except Exception as e:
+            print(f"Error refreshing token deny-list: {str(e)}")
+
+
+token_deny_list = TokenDenyList(
+    size_bits=settings.TOKEN_DENYLIST_BLOOM_BITS,
+    hash_count=settings.TOKEN_DENYLIST_HASH_COUNT,
+    refresh_seconds=settings.TOKEN_DENYLIST_REFRESH_SECONDS,
+)
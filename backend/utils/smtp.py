@@ -0,0 +1,97 @@
+import smtplib
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from core.config import settings
+
+
+class SMTPConnectionPool:
+    """
+    Pool of logged-in SMTP connections shared by the email sender threads.
+
+    Connecting, STARTTLS and login happen once per connection instead of once
+    per message. Connections idle for longer than `idle_seconds` are closed
+    rather than reused, since servers drop them on their side anyway.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        max_idle: int = 4,
+        idle_seconds: float = 60.0,
+        timeout: float = 30.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self.timeout = timeout
+        self.connects = 0
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self.connects += 1
+        return connection
+
+    def acquire(self) -> smtplib.SMTP:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                connection, released_at = self._idle.pop()
+                if now - released_at < self.idle_seconds:
+                    return connection
+                self._close(connection)
+        return self._connect()
+
+    def release(self, connection: smtplib.SMTP) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    def discard(self, connection: smtplib.SMTP) -> None:
+        # Connection in an unknown state after an error, never hand it out again
+        self._close(connection)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"idle": len(self._idle), "connects": self.connects}
+
+
+smtp_pool = SMTPConnectionPool(
+    host=settings.SMTP_HOST,
+    port=settings.SMTP_PORT,
+    username=settings.SMTP_USERNAME,
+    password=settings.SMTP_PASSWORD,
+    starttls=settings.SMTP_STARTTLS,
+    max_idle=settings.EMAIL_WORKERS,
+    idle_seconds=settings.SMTP_IDLE_SECONDS,
+)
@@ -0,0 +1,50 @@
+import math
+from typing import Dict, Hashable, List
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: keys are scheduled a number of ticks ahead and come due
+    as the wheel is advanced, one slot per tick.
+
+    Scheduling, cancelling and advancing cost O(1) per key no matter how many
+    keys are pending. Delays longer than one revolution wait out extra rounds
+    in their slot. Not thread-safe, it is meant to be driven by one asyncio task.
+    """
+
+    def __init__(self, tick_seconds: float = 1.0, slots: int = 60):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._cursor = 0
+
+    def schedule(self, key: Hashable, delay_seconds: float) -> None:
+        # Rescheduling a pending key moves it, a key is only ever due once
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay_seconds / self.tick_seconds))
+        rounds, offset = divmod(ticks - 1, len(self._slots))
+        slot = (self._cursor + 1 + offset) % len(self._slots)
+        self._slots[slot][key] = rounds
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            del self._slots[slot][key]
+
+    def advance(self) -> List[Hashable]:
+        """Move the wheel one tick forward and return the keys that came due."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        due = []
+        for key, rounds in list(slot.items()):
+            if rounds:
+                slot[key] = rounds - 1
+                continue
+            del slot[key]
+            del self._slot_of[key]
+            due.append(key)
+        return due
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
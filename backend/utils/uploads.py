@@ -0,0 +1,57 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import BinaryIO, Tuple
+
+from fastapi import HTTPException, status
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _copy_to_file(source: BinaryIO, file_path: str, max_bytes: int, chunk_bytes: int) -> int:
+    # Write next to the destination so the final rename stays on one filesystem
+    directory = os.path.dirname(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as target:
+            while True:
+                chunk = source.read(chunk_bytes)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                target.write(chunk)
+            target.flush()
+            os.fsync(target.fileno())
+        # mkstemp creates the file owner-only, images are served to everyone
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, file_path)
+        return size
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+async def save_upload(source: BinaryIO, file_path: str, max_bytes: int, chunk_bytes: int) -> Tuple[int, float]:
+    """
+    Stream an uploaded file to `file_path` in fixed-size chunks off the event loop.
+
+    The data lands in a temporary file that is renamed over the destination once
+    complete, so readers never see a partial image. Uploads larger than
+    `max_bytes` are rejected with a 413 while streaming. Returns the number of
+    bytes written and the elapsed seconds.
+    """
+    started = time.perf_counter()
+    try:
+        size = await asyncio.to_thread(_copy_to_file, source, file_path, max_bytes, chunk_bytes)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Upload exceeds the {max_bytes} byte limit",
+        )
+    return size, time.perf_counter() - started
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+
+
+class BoundedWorkerPool:
+    """
+    Thread pool for CPU-bound work with a bounded wait queue.
+
+    Calls beyond `max_workers + max_queue` pending jobs are rejected
+    immediately with a 503 instead of piling up behind the pool.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+        succeeded = False
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, func, *args)
+            succeeded = True
+            return result
+        finally:
+            # Jobs that raised or were cancelled are not throughput
+            with self._lock:
+                self._pending -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._pending, self.max_workers),
+                "queued": max(self._pending - self.max_workers, 0),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }